@@ -0,0 +1,3 @@
+"""
+Benchmarks of the package, run as modules, eg. `python3 -m benchmarks.startup`
+"""
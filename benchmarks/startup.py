@@ -0,0 +1,69 @@
+"""
+Start-up time of the CLI: runs each command many times in a fresh
+interpreter and reports the median wall time next to that of a bare
+interpreter, along with the modules of the package each one imports.
+
+    $ python3 -m benchmarks.startup -n 20
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COMMANDS = {
+    'bare':     ['-c', 'pass'],
+    'import':   ['-c', 'import genie'],
+    'random':   ['-m', 'genie', 'random'],
+    'info':     ['-m', 'genie', 'info', 'GGIVNX'],
+    'change':   ['-m', 'genie', 'change', 'GGIVNX', '-v', '77'],
+    'help':     ['-m', 'genie', '--help'],
+}
+
+
+def run(args, env):
+    start = time.perf_counter()
+    subprocess.run([sys.executable] + args, env=env, check=True,
+        stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+def imported(args, env):
+    # Modules of the package imported, from `-X importtime`
+    result = subprocess.run([sys.executable, '-X', 'importtime'] + args,
+        env=env, check=True, stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE, text=True)
+    return sorted(
+        L.rsplit('|', 1)[1].strip() for L in result.stderr.splitlines()
+        if L.rsplit('|', 1)[-1].strip().startswith('genie')
+    )
+
+def main():
+    parser = argparse.ArgumentParser('benchmarks.startup')
+    parser.add_argument('-n', '--runs', type=int, default=20,
+        help='Runs of each command; default is `20`')
+    parser.add_argument('--json', action='store_true',
+        help='Print a JSON record per command')
+    args = parser.parse_args()
+
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    for name, command in COMMANDS.items():
+        run(command, env)   # warm up, and write the bytecode caches
+        times = [run(command, env) for _ in range(args.runs)]
+        record = {
+            'command':  name,
+            'median_ms': round(statistics.median(times) * 1000, 2),
+            'min_ms':   round(min(times) * 1000, 2),
+            'modules':  imported(command, env),
+        }
+        if args.json:
+            print(json.dumps(record))
+        else:
+            print(f"{name:8} {record['median_ms']:8.2f} ms  "
+                f"(min {record['min_ms']:.2f})  {' '.join(record['modules'])}")
+
+if __name__ == '__main__':
+    main()
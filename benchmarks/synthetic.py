@@ -0,0 +1,125 @@
+"""
+Synthetic iNES ROMs for the benchmarks, so that no (copyrighted) game is
+needed. The PRG ROM is a stream of random but valid 6502 instructions with
+the idioms the library looks for (an immediate load stored to memory, a
+decrement of memory) planted at known places, and the interrupt vectors of
+each 32k window pointing into it. Everything follows from the seed.
+
+    $ python3 -m benchmarks.synthetic -p 8 -c 4 -o game.nes
+"""
+import argparse
+import random
+import struct
+from typing import NamedTuple
+
+from genie.decompile import _op_table
+
+PRG_BANK_SIZE = 16384
+CHR_BANK_SIZE = 8192
+
+# Idioms planted in the code, by the name of the search pattern which finds
+# them (see ::genie.guess._assign_patterns), as the bytes of the
+# instructions with the immediate value at `{value}` and the memory address
+# at `{lo}` and `{hi}`. The offset is that of the immediate value.
+IDIOMS = {
+    'LDA/STA_A':    ('A9 {value} 8D {lo} {hi}', 1),
+    'LDA/STA_Z':    ('A9 {value} 85 {lo}', 1),
+    'LDX/STX_A':    ('A2 {value} 8E {lo} {hi}', 1),
+    'LDY/STY_A':    ('A0 {value} 8C {lo} {hi}', 1),
+    'DEC_Z':        ('C6 {lo}', 0),
+    'DEC_A':        ('CE {lo} {hi}', 0),
+}
+
+# Instructions of the filler, leaving out BRK and the jumps so that a trace
+# of the code runs through most of it
+_filler = sorted(
+    (opcode, len(op)) for opcode, op in _op_table.items()
+    if opcode not in (0x00, 0x20, 0x40, 0x4C, 0x60, 0x6C)
+)
+
+
+class Planted(NamedTuple):
+    idiom:      str
+    value:      int     # immediate value, or None for the decrements
+    location:   int     # PRG ROM offset of the immediate (or the opcode)
+
+
+def make_rom(prg_banks=2, chr_banks=1, seed=0, density=0.02, values=8,
+        mapper=None):
+    """
+    Creates a synthetic iNES ROM.
+
+    Parameters:
+    prg_banks: int
+        Number of 16k PRG ROM banks
+    chr_banks: int
+        Number of 8k CHR ROM banks, random data
+    seed: int
+        Seed of everything random in the ROM
+    density: float
+        Chance of each instruction being an idiom
+    values: int
+        Immediate values of the idioms are drawn from 0 up to VALUES, so
+        that each is found many times
+    mapper: int = None
+        Mapper number for the header. Default is NROM (0) for up to 32k of
+        PRG ROM, otherwise UNROM (2) without CHR ROM, else MMC1 (1).
+
+    Returns: Tuple[bytes, List[Planted]]
+    The image of the ROM and the idioms planted in it
+    """
+    rng = random.Random(seed)
+    prg, planted = bytearray(), []
+    idioms = list(IDIOMS.items())
+
+    size = PRG_BANK_SIZE * prg_banks
+    while len(prg) < size:
+        if len(prg) % 0x8000 >= 0x8000 - 16:
+            # Room for the vectors at the end of the window, see below
+            prg += bytes(0x8000 - len(prg) % 0x8000)
+            continue
+        if rng.random() < density:
+            name, (template, offset) = rng.choice(idioms)
+            value = rng.randrange(values)
+            code = bytes.fromhex(template.format(value=f'{value:02X}',
+                lo=f'{rng.randrange(1, 256):02X}',
+                hi=f'{rng.randrange(8):02X}'))
+            planted.append(Planted(name,
+                value if 'value' in template else None, len(prg) + offset))
+            prg += code
+        else:
+            opcode, length = rng.choice(_filler)
+            prg.append(opcode)
+            prg += rng.randbytes(length - 1)
+    del prg[size:]
+
+    # NMI, RESET and IRQ of each 32k window point to its start
+    for end in range(min(size, 0x8000), size + 1, 0x8000):
+        prg[end - 6:end] = struct.pack('<HHH', 0x8000, 0x8000, 0x8000)
+    planted = [P for P in planted if P.location < size - 16]
+
+    if mapper is None:
+        mapper = 0 if prg_banks <= 2 else 2 if not chr_banks else 1
+    header = b'NES\x1a' + bytes((prg_banks, chr_banks, (mapper & 0xF) << 4,
+        mapper & 0xF0)) + bytes(8)
+    return header + prg + rng.randbytes(CHR_BANK_SIZE * chr_banks), planted
+
+
+def main():
+    parser = argparse.ArgumentParser('benchmarks.synthetic')
+    parser.add_argument('-p', '--prg', type=int, default=2,
+        help='16k PRG ROM banks; default is `2`')
+    parser.add_argument('-c', '--chr', type=int, default=1,
+        help='8k CHR ROM banks; default is `1`')
+    parser.add_argument('-s', '--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', required=True,
+        help='Path of the ROM file to write')
+    args = parser.parse_args()
+
+    data, planted = make_rom(args.prg, args.chr, args.seed)
+    with open(args.output, 'wb') as file:
+        file.write(data)
+    print(f'{len(planted)} idioms planted')
+
+if __name__ == '__main__':
+    main()
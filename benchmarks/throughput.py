@@ -0,0 +1,201 @@
+"""
+Throughput of the codec, the search, improving codes and the disassembly
+over synthetic ROMs (see ::benchmarks.synthetic) of a few sizes, and of the
+vectorized codec, improving and random codes (see ::genie.batch), which are
+skipped without NumPy. Each benchmark is run a few times and the best time
+is reported, as codes or megabytes per second, one JSON record per line
+with `--json`. Passing the output of an earlier run as `--baseline` adds the
+ratio to it.
+
+    $ python3 -m benchmarks.throughput --json > before.json
+    $ python3 -m benchmarks.throughput --baseline before.json
+"""
+import argparse
+import importlib.util
+import io
+import json
+import random
+import sys
+import time
+
+from genie import addr_data_to_code, code_to_data_addr, guess_safer_code, \
+    iter_guesses_based_on_char
+from genie.decompile import disassemble
+from genie.rom import Rom
+
+from .synthetic import make_rom
+
+# (PRG banks, CHR banks) of the ROMs: NROM, UNROM, MMC1 and a large one
+SIZES = [(2, 1), (8, 0), (16, 16), (32, 0)]
+
+CODES = 20000
+# Codes generated by the bulk random benchmark
+RANDOM = 1000000
+
+
+def best(function, runs):
+    # Least wall time of RUNS calls of FUNCTION
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def random_codes(count, seed=0):
+    rng = random.Random(seed)
+    return [
+        addr_data_to_code(rng.randrange(0x8000, 0x10000), rng.randrange(256),
+            rng.randrange(256) if rng.random() < 0.5 else False)
+        for _ in range(count)
+    ]
+
+
+def bench_encode(rom, codes, runs):
+    decoded = [code_to_data_addr(C) for C in codes]
+    def run():
+        for addr, data, compare in decoded:
+            addr_data_to_code(addr, data,
+                compare if compare is not None else False)
+    return best(run, runs), len(codes), 'codes'
+
+def bench_decode(rom, codes, runs):
+    def run():
+        for code in codes:
+            code_to_data_addr(code)
+    return best(run, runs), len(codes), 'codes'
+
+def bench_search(rom, codes, runs):
+    # A new ::Rom each run, so nothing derived from it is reused
+    def run():
+        copy = Rom(rom.buffer)
+        for value in range(8):
+            for _ in iter_guesses_based_on_char(bytes((value,)), copy):
+                pass
+    return best(run, runs), 8 * len(rom.prg), 'bytes'
+
+def bench_search_code_only(rom, codes, runs):
+    def run():
+        copy = Rom(rom.buffer)
+        for value in range(8):
+            for _ in iter_guesses_based_on_char(bytes((value,)), copy,
+                    code_only=True):
+                pass
+    return best(run, runs), 8 * len(rom.prg), 'bytes'
+
+def bench_improve(rom, codes, runs):
+    codes = codes[:2000]
+    def run():
+        for code in codes:
+            guess_safer_code(code, rom)
+    return best(run, runs), len(codes), 'codes'
+
+def bench_disassemble(rom, codes, runs):
+    return best(lambda: disassemble(rom.prg), runs), len(rom.prg), 'bytes'
+
+def bench_batch_encode(rom, codes, runs):
+    from genie.batch import decode_codes, encode_codes
+    addr, data, compare = decode_codes(codes)
+    short = compare < 0
+    def run():
+        encode_codes(addr[~short], data[~short], compare[~short])
+        encode_codes(addr[short], data[short])
+    return best(run, runs), len(codes), 'codes'
+
+def bench_batch_decode(rom, codes, runs):
+    import numpy as np
+    from genie.batch import decode_codes
+    codes = np.array([C.encode() for C in codes])
+    return best(lambda: decode_codes(codes), runs), len(codes), 'codes'
+
+def bench_batch_improve(rom, codes, runs):
+    from genie.batch import guess_safer_codes
+    return best(lambda: guess_safer_codes(codes, rom), runs), len(codes), \
+        'codes'
+
+def bench_random(rom, codes, runs):
+    from genie.batch import write_random_codes
+    def run():
+        write_random_codes(io.BytesIO(), RANDOM, seed=0)
+    return best(run, runs), RANDOM, 'codes'
+
+BENCHMARKS = {
+    'encode':           bench_encode,
+    'decode':           bench_decode,
+    'search':           bench_search,
+    'search_code_only': bench_search_code_only,
+    'improve':          bench_improve,
+    'disassemble':      bench_disassemble,
+    'batch_encode':     bench_batch_encode,
+    'batch_decode':     bench_batch_decode,
+    'batch_improve':    bench_batch_improve,
+    'random':           bench_random,
+}
+_codec = {'encode', 'decode', 'batch_encode', 'batch_decode', 'random'}
+_numpy = {'batch_encode', 'batch_decode', 'batch_improve', 'random'}
+
+
+def rate(record):
+    return record.get('codes_per_s') or record.get('mb_per_s')
+
+def main():
+    parser = argparse.ArgumentParser('benchmarks.throughput')
+    parser.add_argument('-n', '--runs', type=int, default=3,
+        help='Runs of each benchmark, the best is reported; default is `3`')
+    parser.add_argument('-s', '--seed', type=int, default=0,
+        help='Seed of the ROMs and codes; default is `0`')
+    parser.add_argument('-b', '--benchmark', action='append',
+        choices=list(BENCHMARKS), help='Benchmark(s) to run; default is all')
+    parser.add_argument('--baseline', type=argparse.FileType('r'),
+        help='JSON output of an earlier run to compare with')
+    parser.add_argument('--json', action='store_true',
+        help='Print a JSON record per benchmark and ROM')
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.baseline:
+        for line in args.baseline:
+            record = json.loads(line)
+            baseline[record['benchmark'], record['rom']] = rate(record)
+
+    codes = random_codes(CODES, args.seed)
+    chosen = args.benchmark or list(BENCHMARKS)
+    if importlib.util.find_spec('numpy') is None:
+        skipped = [B for B in chosen if B in _numpy]
+        if skipped:
+            print(f"Skipping {', '.join(skipped)}: NumPy isn't installed",
+                file=sys.stderr)
+        chosen = [B for B in chosen if B not in _numpy]
+    # The codec doesn't depend on the ROM, so is run once
+    runs = [(B, None) for B in chosen if B in _codec]
+    for prg_banks, chr_banks in SIZES:
+        data, _ = make_rom(prg_banks, chr_banks, args.seed)
+        runs.extend((B, (f'{prg_banks}p{chr_banks}c', Rom(data)))
+            for B in chosen if B not in _codec)
+
+    for benchmark, rom in runs:
+        name, rom = rom or ('-', None)
+        seconds, count, unit = BENCHMARKS[benchmark](rom, codes, args.runs)
+        record = {
+            'benchmark':    benchmark,
+            'rom':          name,
+            'seconds':      round(seconds, 6),
+        }
+        if unit == 'codes':
+            record['codes_per_s'] = round(count / seconds)
+        else:
+            record['mb_per_s'] = round(count / seconds / 1e6, 3)
+        if (benchmark, name) in baseline:
+            record['ratio'] = round(rate(record) / baseline[benchmark, name],
+                3)
+
+        if args.json:
+            print(json.dumps(record), flush=True)
+        else:
+            unit = 'codes/s' if unit == 'codes' else 'MB/s'
+            ratio = f"  x{record['ratio']}" if 'ratio' in record else ''
+            print(f'{benchmark:17} {name:7} {rate(record):>12} {unit}{ratio}',
+                flush=True)
+
+if __name__ == '__main__':
+    main()
@@ -1,77 +1,475 @@
 import argparse
+import io
+import sys
 
-from . import *
+from . import addr_data_to_code, code_to_data_addr, random_code
 
 def do_RANDOM(args):
-    for _ in range(args.count):
+    if args.count == 1 and args.seed is None and args.length == 6 \
+            and args.addr is None:
         print(random_code())
+        return
+
+    from .batch import write_random_codes
+    start, end = args.addr or (0x8000, 0x10000)
+    try:
+        write_random_codes(sys.stdout.buffer, args.count, args.length,
+            start, end, args.seed)
+        sys.stdout.flush()
+    except BrokenPipeError:
+        _stdout_closed()
+
+def _addr_range(text):
+    try:
+        first, last = (int(A, 0) for A in text.split('-'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'Not a range: {text}')
+    if not 0x8000 <= first <= last <= 0xFFFF:
+        raise argparse.ArgumentTypeError(
+            'Addresses must be within $8000-$FFFF')
+    return first, last + 1
 
 def do_DETAIL(args):
+    if not args.code and not args.input:
+        parser.error('info: give a code or --input')
+    if args.input or args.format != 'text':
+        from .batch import decode_codes, format_codes
+        _write_chunks(format_codes(codes, *decode_codes(codes), args.format)
+            for codes in _iter_code_chunks(args))
+        return
+
     for code in args.code:
         addr, value, cmp = code_to_data_addr(code)
-        if cmp:
+        if cmp is not None:
             print(f"{code} => addr={hex(addr)}, value={value}, check={cmp}")
         else:
             print(f"{code} => addr={hex(addr)}, value={value}")
 
 def do_CHANGE(args):
-    addr, value, cmp = code_to_data_addr(args.code)
-    code = addr_data_to_code(addr, args.value, cmp or False)
-    print(code)
+    if not args.code and not args.input:
+        parser.error('change: give a code or --input')
+    if args.input or args.format != 'text':
+        from .batch import change_codes, decode_codes, format_codes
+        def chunks():
+            for codes in _iter_code_chunks(args):
+                codes = change_codes(codes, args.value)
+                if args.format == 'text':
+                    yield b'\n'.join(codes.tolist()) + b'\n'
+                else:
+                    yield format_codes(codes, *decode_codes(codes),
+                        args.format)
+        _write_chunks(chunks())
+        return
+
+    for code in args.code:
+        addr, value, cmp = code_to_data_addr(code)
+        print(addr_data_to_code(addr, args.value,
+            cmp if cmp is not None else False))
+
+def _iter_code_chunks(args):
+    # The valid codes of ARGS, in chunks. Invalid ones are reported and
+    # skipped.
+    import numpy as np
+    from .batch import read_codes, valid_codes
+    if args.code:
+        codes = np.array(args.code)
+        valid = valid_codes(codes)
+        for code in codes[~valid].tolist():
+            print(f'genie: invalid code {code!r}', file=sys.stderr)
+        if valid.any():
+            yield codes[valid]
+    if args.input:
+        for codes, lines in read_codes(args.input, lines=True):
+            valid = valid_codes(codes)
+            if not valid.all():
+                for code, line in zip(codes[~valid].tolist(),
+                        lines[~valid].tolist()):
+                    _invalid_code(code, line)
+                codes = codes[valid]
+            if len(codes):
+                yield codes
+
+def _invalid_code(code, line):
+    code = code.decode(errors='replace')
+    print(f'genie: invalid code {code!r} on line {line}', file=sys.stderr)
+
+def _write_chunks(chunks, flush=False):
+    # Writes the bytes of CHUNKS to stdout, each as soon as it is made if
+    # FLUSH, stopping quietly if stdout is closed
+    out = sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+            if flush:
+                out.flush()
+        out.flush()
+    except BrokenPipeError:
+        _stdout_closed()
+
+def _stdout_closed():
+    # Eg. piped into `head`. What is left to write at exit goes nowhere,
+    # rather than failing again.
+    import os
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, sys.stdout.fileno())
 
 def do_IMPROVE(args):
-    for code in guess_safer_code(args.code, args.rom):
-        print(code)
+    if not args.code and not args.input:
+        parser.error('improve: give a code or --input')
+    if len(args.code) == 1 and not args.input:
+        from . import guess_safer_code
+        code = args.code[0]
+        # Ordered by compare value, as by ::batch.guess_safer_codes
+        improved = sorted(guess_safer_code(code, args.rom),
+            key=lambda C: code_to_data_addr(C)[2])
+        if args.format == 'text':
+            # Just the improved codes, a line each
+            lines = ''.join(C + '\n' for C in improved)
+        else:
+            lines = _format_improved(code, improved, args.format)
+        _write_chunks([lines.encode()])
+        return
+
+    from .batch import guess_safer_codes
+    _write_chunks(''.join(_format_improved(C, I, args.format)
+            for C, I in guess_safer_codes(codes, args.rom).items()).encode()
+        for codes in _iter_code_chunks(args))
+
+def _format_improved(code, improved, format):
+    if format == 'jsonl':
+        import json
+        return json.dumps({'code': code, 'improved': improved}) + '\n'
+    return f"{code}\t{' '.join(improved)}\n"
+
+def do_CHECK(args):
+    from .cpu import screen_codes
+    codes = list(args.code)
+    if args.input:
+        codes.extend(args.input.read().decode().split())
+    results = screen_codes(args.rom, codes, frames=args.frames)
+    for code, result in results.items():
+        status = (result.crash or 'ok') if result.reached else 'not reached'
+        print(f"{code}\t{status}\tpc={hex(result.pc)}")
+
+def do_BATCH(args):
+    import json
+    from .library import Query, scan_library
+    queries = [Query('search', V, args.value) for V in args.search] \
+        + [Query('improve', C) for C in args.improve]
+    if not queries:
+        parser.error('batch: give at least one --search or --improve')
+    for record in scan_library(args.path, queries, args.jobs):
+        sys.stdout.write(json.dumps(record) + '\n')
+        sys.stdout.flush()
 
 def do_CHARSEEK(args):
-    for code in guess_based_on_char(args.char, args.rom, write=args.value):
-        print(code)
-
-parser = argparse.ArgumentParser('genie')
-commands = parser.add_subparsers(title='action', help='Action to be performed')
-
-random = commands.add_parser('random',
-    help='Generate random code', aliases=['r'])
-random.add_argument('-n', '--count', type=int, default=1,
-    help="Number of codes to generate")
-random.set_defaults(func=do_RANDOM)
-
-
-detail = commands.add_parser('info', aliases=['n'],
-    help="Get info on code")
-detail.add_argument('code', help='6-character code to improve',
-    nargs='+')
-detail.set_defaults(func=do_DETAIL)
-
-
-change = commands.add_parser('change', aliases=['e'],
-    help="Change details of a code")
-change.add_argument('code', help='6-/8-character code to change')
-change.add_argument('-v', '--value', required=True,
-    type=lambda c: int(c, 0),
-    help='Replacement value')
-change.set_defaults(func=do_CHANGE)
-
-
-improve = commands.add_parser('improve',
-    help='Expand code to 8-character using a ROM', aliases=['i'])
-improve.add_argument('code', help='6-character code to improve')
-improve.add_argument('-r', '--rom', required=True,
-    help='Path to ROM file')
-improve.set_defaults(func=do_IMPROVE)
-
-
-charseek = commands.add_parser('search', aliases=['s', 'char'],
-    help='Find where a value is statically assigned')
-charseek.add_argument('char', 
-    help='Character/value to search for, use `0x` prefix for hex/base-16',
-    type=lambda c: chr(int(c, 0)).encode())
-charseek.add_argument('-r', '--rom', required=True,
-    help='Path to ROM file')
-charseek.add_argument('-v', '--value', default=200,
-    help='Replacement value; default is `200`',
-    type=lambda c: int(c, 0))
-charseek.set_defaults(func=do_CHARSEEK)
-
-args = parser.parse_args()
-args.func(args)
\ No newline at end of file
+    from . import iter_guesses_based_on_char
+    codes = iter_guesses_based_on_char(args.char, args.rom,
+        write=args.value, use_index=args.index and args.jobs is None,
+        code_only=args.code_only, workers=args.jobs, limit=args.limit,
+        ranked=args.rank)
+    # Each as soon as it is found
+    _write_chunks(((C + '\n').encode() for C in codes), flush=True)
+
+def do_RAM(args):
+    from .ramsearch import find_cheats, narrow, read_snapshots
+    snapshots = read_snapshots(args.snapshot, args.offset)
+    relations = args.change or ['changed']
+    if len(relations) == 1:
+        relations = relations[0]
+    equal = None
+    if args.equal:
+        equal = [int(V, 0) if V.strip() else None
+            for V in args.equal.split(',')]
+        equal += [None] * (len(snapshots) - len(equal))
+    try:
+        addresses = narrow(snapshots, relations, equal)
+    except ValueError as e:
+        parser.error(f'ram: {e}')
+
+    if args.rom is None:
+        for addr in addresses:
+            print(f'0x{addr:04x}')
+        return
+    for cheat in find_cheats(args.rom, addresses, args.value):
+        print(f'{cheat.code}\t0x{cheat.addr:04x}\t{cheat.kind}')
+
+def do_DB(args):
+    from .codedb import CodeDB
+    db = CodeDB()
+    for path in args.input:
+        if path == '-':
+            db += CodeDB.read(sys.stdin.buffer, invalid=_invalid_code)
+            continue
+        with open(path, 'rb') as file:
+            data = file.read()
+        if data.startswith(CodeDB.MAGIC):
+            db += CodeDB.frombytes(data)
+        else:
+            db += CodeDB.read(io.BytesIO(data), invalid=_invalid_code)
+
+    if args.addr:
+        db = db.range(*args.addr)
+    if args.duplicates:
+        db = db.duplicates()
+    elif args.conflicts:
+        db = db.conflicts()
+
+    if args.output:
+        db.save(args.output)
+    else:
+        codes = db.codes()
+        if len(codes):
+            sys.stdout.buffer.write(b'\n'.join(codes.tolist()) + b'\n')
+
+def do_PORT(args):
+    from .port import port_codes
+    codes = list(args.code)
+    if args.input:
+        codes.extend(args.input.read().decode().split())
+    for code, port in port_codes(codes, args.source, args.target).items():
+        if port is None:
+            print(f'{code}\t\t0')
+        else:
+            print(f'{code}\t{port.code}\t{port.score}')
+
+def do_SERVE(args):
+    import asyncio
+    from .server import serve
+    try:
+        asyncio.run(serve(args.socket, port=args.port,
+            max_roms=args.max_roms))
+    except KeyboardInterrupt:
+        pass
+
+def add_RANDOM(commands):
+    random = commands.add_parser('random',
+        help='Generate random code', aliases=['r'])
+    random.add_argument('-n', '--count', type=int, default=1,
+        help="Number of codes to generate")
+    random.add_argument('-s', '--seed', type=int, default=None,
+        help='Seed, to generate the same codes again')
+    random.add_argument('-l', '--length', type=int, default=6, choices=[6, 8],
+        help='Letters per code; 8-letter codes have a compare value')
+    random.add_argument('-a', '--addr', type=_addr_range, default=None,
+        help='Range of addresses to patch, eg. `0xC000-0xFFFF` for the '
+            'fixed bank; default is all of $8000-$FFFF')
+    random.set_defaults(func=do_RANDOM)
+
+def add_DETAIL(commands):
+    detail = commands.add_parser('info', aliases=['n'],
+        help="Get info on code")
+    detail.add_argument('code', help='6-/8-character code(s) to describe',
+        nargs='*')
+    detail.add_argument('-i', '--input', type=argparse.FileType('rb'),
+        help='Read whitespace-separated codes from file, `-` for stdin')
+    detail.add_argument('-f', '--format', default='text',
+        choices=['text', 'tsv', 'jsonl', 'bin'],
+        help='Output format; default is `text`')
+    detail.set_defaults(func=do_DETAIL)
+
+def add_CHANGE(commands):
+    change = commands.add_parser('change', aliases=['e'],
+        help="Change details of a code")
+    change.add_argument('code', help='6-/8-character code(s) to change',
+        nargs='*')
+    change.add_argument('-v', '--value', required=True,
+        type=lambda c: int(c, 0),
+        help='Replacement value')
+    change.add_argument('-i', '--input', type=argparse.FileType('rb'),
+        help='Read whitespace-separated codes from file, `-` for stdin')
+    change.add_argument('-f', '--format', default='text',
+        choices=['text', 'tsv', 'jsonl', 'bin'],
+        help='Output format; default is `text`, just the codes')
+    change.set_defaults(func=do_CHANGE)
+
+def add_IMPROVE(commands):
+    improve = commands.add_parser('improve',
+        help='Expand code to 8-character using a ROM', aliases=['i'])
+    improve.add_argument('code', help='6-character code(s) to improve',
+        nargs='*')
+    improve.add_argument('-r', '--rom', required=True,
+        help='Path to ROM file')
+    improve.add_argument('-i', '--input', type=argparse.FileType('rb'),
+        help='Read whitespace-separated codes from file, `-` for stdin')
+    improve.add_argument('-f', '--format', default='text',
+        choices=['text', 'jsonl'],
+        help='Output format; default is `text`, each code and its improved '
+             'codes on a line (or for a single code, each improved one)')
+    _add_metrics(improve)
+    improve.set_defaults(func=do_IMPROVE)
+
+def add_CHECK(commands):
+    check = commands.add_parser('check', aliases=['c'],
+        help='Run the ROM with each code and report crashes')
+    check.add_argument('code', help='6-/8-character code(s) to check',
+        nargs='*')
+    check.add_argument('-r', '--rom', required=True,
+        help='Path to ROM file')
+    check.add_argument('-i', '--input', type=argparse.FileType('rb'),
+        help='Read whitespace-separated codes from file, `-` for stdin')
+    check.add_argument('-n', '--frames', type=int, default=60,
+        help='Number of frames to run; default is `60`, a second. The ROM '
+             'runs at about a million instructions a second, so each code '
+             'it reads takes about 0.4s at 60 frames, unless its run gets '
+             'back in step with the run without codes')
+    check.set_defaults(func=do_CHECK)
+
+def add_CHARSEEK(commands):
+    charseek = commands.add_parser('search', aliases=['s', 'char'],
+        help='Find where a value is statically assigned')
+    charseek.add_argument('char', 
+        help='Character/value to search for, use `0x` prefix for hex/base-16',
+        type=lambda c: bytes((int(c, 0),)))
+    charseek.add_argument('-r', '--rom', required=True,
+        help='Path to ROM file')
+    charseek.add_argument('-v', '--value', default=200,
+        help='Replacement value; default is `200`',
+        type=lambda c: int(c, 0))
+    charseek.add_argument('--no-index', dest='index', action='store_false',
+        help='Scan the ROM rather than using (and caching) an index of it')
+    charseek.add_argument('--code-only', action='store_true',
+        help='Skip data: only consider code reachable from the interrupt '
+            'vectors')
+    charseek.add_argument('-n', '--limit', type=int, default=None,
+        help='Stop after this many codes')
+    charseek.add_argument('--rank', action='store_true',
+        help='List codes for memory which is also counted up or down first')
+    charseek.add_argument('-j', '--jobs', type=int, default=None,
+        help='Scan the ROM in chunks over this many processes (implies '
+            '`--no-index`)')
+    _add_metrics(charseek)
+    charseek.set_defaults(func=do_CHARSEEK)
+
+def add_BATCH(commands):
+    batch = commands.add_parser('batch', aliases=['b'],
+        help='Search/improve across a library of ROMs, in parallel')
+    batch.add_argument('path', nargs='+',
+        help='ROM files, directories and zip archives of ROMs')
+    batch.add_argument('-s', '--search', action='append', default=[],
+        type=lambda c: int(c, 0),
+        help='Value to search for (see `search`), may be repeated')
+    batch.add_argument('-c', '--improve', action='append', default=[],
+        help='Code to improve (see `improve`), may be repeated')
+    batch.add_argument('-v', '--value', default=200,
+        type=lambda c: int(c, 0),
+        help='Replacement value for searches; default is `200`')
+    batch.add_argument('-j', '--jobs', type=int, default=None,
+        help='Number of worker processes; default is one per CPU')
+    batch.set_defaults(func=do_BATCH)
+
+def add_RAM(commands):
+    ram = commands.add_parser('ram', aliases=['m'],
+        help='Find RAM addresses from snapshots, and codes for them')
+    ram.add_argument('snapshot', nargs='+',
+        help='Files of 2k RAM snapshots, in the order taken')
+    ram.add_argument('-c', '--change', action='append',
+        choices=['unchanged', 'changed', 'increased', 'decreased', 'any'],
+        help='How each snapshot differs from the one before (by one for '
+            '`increased`/`decreased`); give once for all of them or once per '
+            'snapshot after the first; default is `changed`')
+    ram.add_argument('-e', '--equal',
+        help='Known values in the snapshots, comma separated and blank if '
+            'not known, eg. `3,,1`')
+    ram.add_argument('--offset', type=lambda c: int(c, 0), default=None,
+        help='Offset of the RAM in the files, eg. for save states')
+    ram.add_argument('-r', '--rom',
+        help='Path to ROM file, to make codes for the addresses found')
+    ram.add_argument('-v', '--value', default=200,
+        type=lambda c: int(c, 0),
+        help='Replacement value for stores; default is `200`')
+    ram.set_defaults(func=do_RAM)
+
+def add_DB(commands):
+    db = commands.add_parser('db', aliases=['d'],
+        help='Merge, query and check large collections of codes')
+    db.add_argument('input', nargs='+',
+        help='Code databases (see `-o`) or files of whitespace-separated '
+            'codes, `-` for stdin')
+    db.add_argument('-o', '--output',
+        help='Save the codes as a packed database rather than listing them')
+    db.add_argument('-a', '--addr', type=_addr_range, default=None,
+        help='Only the codes patching a range of addresses, eg. '
+            '`0xC000-0xFFFF`')
+    which = db.add_mutually_exclusive_group()
+    which.add_argument('--duplicates', action='store_true',
+        help='Only the codes repeating another one')
+    which.add_argument('--conflicts', action='store_true',
+        help='Only the codes patching an address with different values or '
+            'compare bytes')
+    db.set_defaults(func=do_DB)
+
+def add_PORT(commands):
+    port = commands.add_parser('port', aliases=['p'],
+        help='Port codes to another revision of the ROM')
+    port.add_argument('code', help='6-/8-character code(s) to port',
+        nargs='*')
+    port.add_argument('-s', '--source', required=True,
+        help='Path to the ROM file the codes are for')
+    port.add_argument('-t', '--target', required=True,
+        help='Path to the ROM file to port the codes to')
+    port.add_argument('-i', '--input', type=argparse.FileType('rb'),
+        help='Read whitespace-separated codes from file, `-` for stdin')
+    port.set_defaults(func=do_PORT)
+
+def add_SERVE(commands):
+    serve = commands.add_parser('serve',
+        help='Answer JSON requests over a socket, keeping ROMs loaded')
+    where = serve.add_mutually_exclusive_group(required=True)
+    where.add_argument('-s', '--socket', help='Path of the Unix socket')
+    where.add_argument('-p', '--port', type=int,
+        help='Local TCP port')
+    serve.add_argument('--max-roms', type=int, default=None,
+        help='Most ROMs to keep open; default is 32')
+    serve.set_defaults(func=do_SERVE)
+
+def _add_metrics(command):
+    command.add_argument('--metrics', '--profile', nargs='?', const='-',
+        metavar='FILE',
+        help='Write the time of each stage, counters and cache hit rates as '
+             'JSON to FILE; default is stderr')
+
+# The name and aliases of each command, and the function adding its parser
+_commands = [
+    (('random', 'r'), add_RANDOM),
+    (('info', 'n'), add_DETAIL),
+    (('change', 'e'), add_CHANGE),
+    (('improve', 'i'), add_IMPROVE),
+    (('check', 'c'), add_CHECK),
+    (('search', 's', 'char'), add_CHARSEEK),
+    (('batch', 'b'), add_BATCH),
+    (('ram', 'm'), add_RAM),
+    (('db', 'd'), add_DB),
+    (('port', 'p'), add_PORT),
+    (('serve',), add_SERVE),
+]
+
+def build_parser(command=None):
+    """
+    Builds the parser for just COMMAND, or for all the commands if COMMAND
+    is None or isn't one of them (eg. `--help`). Setting up the parsers for
+    the commands not used costs more than running the quick ones.
+    """
+    parser = argparse.ArgumentParser('genie')
+    commands = parser.add_subparsers(title='action',
+        help='Action to be performed')
+    known = any(command in names for names, _ in _commands)
+    for names, add in _commands:
+        if not known or command in names:
+            add(commands)
+    return parser
+
+if __name__ == '__main__':
+    parser = build_parser(sys.argv[1] if len(sys.argv) > 1 else None)
+    args = parser.parse_args()
+    if getattr(args, 'metrics', None) is None:
+        args.func(args)
+    else:
+        from .metrics import collect
+        with collect() as metrics:
+            args.func(args)
+        if args.metrics == '-':
+            metrics.dump(sys.stderr)
+        else:
+            with open(args.metrics, 'w') as file:
+                metrics.dump(file)
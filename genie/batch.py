@@ -0,0 +1,373 @@
+# encoding: utf-8
+"""
+Vectorized counterparts of ::addr_data_to_code and ::code_to_data_addr for
+converting large numbers of codes at once. Requires NumPy.
+"""
+import numpy as np
+
+from . import hexcodes, _pack_code, _unpack_address, _unpack_data, \
+    _unpack_compare
+from .mapper import PAGE_SIZE
+from .metrics import active, staged
+from .rom import open_rom
+
+# Nibble => letter (ASCII) and letter (ASCII) => nibble lookup tables. Bytes
+# which are not Game Genie letters map to 0xFF.
+_letters = np.frombuffer(''.join(hexcodes).encode(), dtype=np.uint8)
+_nibbles = np.full(256, 0xFF, dtype=np.uint8)
+_nibbles[_letters] = np.arange(len(_letters), dtype=np.uint8)
+
+
+def encode_codes(addr, data, compare=None):
+    """
+    Vectorized ::addr_data_to_code. Creates a code for each element of the
+    (broadcast) ADDR, DATA and COMPARE arrays.
+
+    Parameters:
+    addr: array-like of int
+        CPU address(es) in $8000-$FFFF to be patched
+    data: array-like of int
+        Replacement value(s)
+    compare: array-like of int = None
+        Compare value(s). If None, 6-letter codes are created, otherwise
+        8-letter codes.
+
+    Returns: numpy.ndarray
+    Array of dtype `S6` or `S8` with the broadcast shape of the arguments.
+    """
+    arrays = [np.asarray(addr, dtype=np.int32), np.asarray(data, dtype=np.int32)]
+    if compare is not None:
+        arrays.append(np.asarray(compare, dtype=np.int32))
+    arrays = np.broadcast_arrays(*arrays)
+    shape = arrays[0].shape
+
+    base = arrays[0] - 0x8000
+    if compare is None:
+        n = _pack_code(base, arrays[1])
+    else:
+        n = _pack_code(base, arrays[1], arrays[2])
+
+    letters = _letters[np.stack(n, axis=-1).astype(np.uint8)]
+    return np.ascontiguousarray(letters).view(f'S{len(n)}').reshape(shape)
+
+
+def decode_codes(codes):
+    """
+    Vectorized ::code_to_data_addr. CODES may be any sequence of 6- and
+    8-letter codes, as `str` or `bytes`, or a NumPy array of such.
+
+    Returns: Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]
+    Three arrays with the shape of CODES: the address (uint16), the data
+    (uint8) and the compare value (int16). The compare value is -1 for
+    6-letter codes.
+
+    Raises ValueError if any code has an invalid length or letter.
+    """
+    codes = np.asarray(codes)
+    shape = codes.shape
+    if codes.dtype.kind == 'U':
+        raw = codes.reshape(-1).view(np.uint32).reshape(-1, codes.dtype.itemsize // 4)
+        if (raw > 0x7F).any():
+            raise ValueError('Invalid code letter')
+        raw = raw.astype(np.uint8)
+    elif codes.dtype.kind == 'S':
+        raw = codes.reshape(-1).view(np.uint8).reshape(-1, codes.dtype.itemsize)
+    else:
+        raise ValueError(f'Unsupported code array type: {codes.dtype}')
+
+    lengths = np.count_nonzero(raw, axis=1)
+    if not np.isin(lengths, (6, 8)).all():
+        raise ValueError('Codes must be 6 or 8 letters long')
+
+    raw = np.pad(raw[:, :8], ((0, 0), (0, max(0, 8 - raw.shape[1]))))
+    long = lengths == 8
+    n = _nibbles[raw]
+    # The padding of 6-letter codes is not a letter, but is also not used
+    if (n[:, :6] == 0xFF).any() or (n[long, 6:] == 0xFF).any():
+        raise ValueError('Invalid code letter')
+    n = list(n.T.astype(np.int32))
+
+    addr = _unpack_address(n).astype(np.uint16)
+    data = _unpack_data(n, np.where(long, n[7], n[5])).astype(np.uint8)
+    compare = np.where(long, _unpack_compare(n), -1).astype(np.int16)
+    return addr.reshape(shape), data.reshape(shape), compare.reshape(shape)
+
+
+@staged('improve')
+def guess_safer_codes(codes, rom_path):
+    """
+    Vectorized ::guess_safer_code. The compare bytes for all of CODES are
+    gathered from every bank which may be switched in at their addresses
+    (see ::BankMap) in one read.
+
+    Returns: Dict[str, List[str]]
+    The 8-letter candidates for each of the (distinct) CODES, ordered by
+    compare value
+    """
+    codes = np.asarray(codes)
+    addr, data, _ = decode_codes(codes)
+    rom = open_rom(rom_path)
+    compares = _bank_bytes(rom.prg, rom.banks, addr)
+
+    # Deduplicate the compare values for each code; -1 is no value
+    compares = np.sort(compares, axis=0)
+    unique = compares >= 0
+    unique[1:] &= compares[1:] != compares[:-1]
+    improved = encode_codes(addr, data, np.maximum(compares, 0))
+
+    result = {}
+    for j, code in enumerate(codes.tolist()):
+        if isinstance(code, bytes):
+            code = code.decode()
+        result[code] = improved[unique[:, j], j].astype(str).tolist()
+
+    metrics = active()
+    if metrics is not None:
+        metrics.count('improve.candidates', int((compares >= 0).sum()))
+        metrics.count('improve.codes', int(unique.sum()))
+    return result
+
+def _bank_bytes(prg, banks, addr):
+    """
+    Returns: numpy.ndarray
+    The bytes of PRG which may be read at each of the CPU addresses ADDR,
+    per the ::BankMap BANKS, as a (banks, len(addr)) int16 array padded
+    with -1
+    """
+    prg = np.frombuffer(prg, dtype=np.uint8)
+    width = max(map(len, banks.pages), default=0) or 1
+    # The offsets of the banks at each 8k page, padded with -1
+    table = np.full((len(banks.pages), width), -1, dtype=np.int64)
+    for page, offsets in enumerate(banks.pages):
+        table[page, :len(offsets)] = offsets
+
+    addr = addr.astype(np.int64)
+    banks = table[(addr - 0x8000) // PAGE_SIZE].T
+    offsets = banks + addr % PAGE_SIZE
+    valid = (banks >= 0) & (offsets < len(prg))
+    result = np.full(offsets.shape, -1, dtype=np.int16)
+    result[valid] = prg[offsets[valid]]
+    return result
+
+
+def read_codes(stream, chunk_size=1 << 20, lines=False):
+    """
+    Reads whitespace-separated codes from binary STREAM in chunks of roughly
+    CHUNK_SIZE bytes.
+
+    Returns: Generator[numpy.ndarray]
+    A generator yielding `bytes` arrays of codes suitable for ::decode_codes,
+    or if LINES, tuples of such an array and the line number of each code
+    """
+    tail = b''
+    line = 1
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        chunk = tail + chunk
+        # The last token may continue in the next chunk
+        cut = max(chunk.rfind(b'\n'), chunk.rfind(b' '), chunk.rfind(b'\t'))
+        tail, chunk = chunk[cut + 1:], chunk[:cut + 1]
+        tokens = chunk.split()
+        if tokens:
+            yield (np.array(tokens), _token_lines(chunk, line)) if lines \
+                else np.array(tokens)
+        line += chunk.count(b'\n')
+
+    tokens = tail.split()
+    if tokens:
+        yield (np.array(tokens), _token_lines(tail, line)) if lines \
+            else np.array(tokens)
+
+def _token_lines(chunk, first):
+    # Line number of each token of CHUNK (as split by `bytes.split`), the
+    # first line being FIRST
+    buf = np.frombuffer(chunk, np.uint8)
+    space = np.isin(buf, np.frombuffer(b' \t\n\r\x0b\x0c', np.uint8))
+    starts = ~space
+    starts[1:] &= space[:-1]
+    return first + np.cumsum(buf == ord('\n'))[starts]
+
+def valid_codes(codes):
+    """
+    Returns: numpy.ndarray
+    A boolean array with the shape of CODES (as for ::decode_codes), true
+    for each code which ::decode_codes accepts
+    """
+    codes = np.asarray(codes)
+    if codes.dtype.kind == 'U':
+        raw = codes.reshape(-1).view(np.uint32).reshape(-1, codes.dtype.itemsize // 4)
+        # Not ASCII, so not a letter either
+        raw = np.minimum(raw, 0x7F).astype(np.uint8)
+    elif codes.dtype.kind == 'S':
+        raw = codes.reshape(-1).view(np.uint8).reshape(-1, codes.dtype.itemsize)
+    else:
+        raise ValueError(f'Unsupported code array type: {codes.dtype}')
+
+    lengths = np.count_nonzero(raw, axis=1)
+    raw = np.pad(raw[:, :8], ((0, 0), (0, max(0, 8 - raw.shape[1]))))
+    letters = _nibbles[raw] != 0xFF
+    valid = np.isin(lengths, (6, 8)) & letters[:, :6].all(axis=1) \
+        & (letters[:, 6:].all(axis=1) | (lengths == 6))
+    return valid.reshape(codes.shape)
+
+
+def change_codes(codes, value):
+    """
+    Vectorized equivalent of re-encoding each of CODES with a new VALUE,
+    keeping the address and compare value (and so the code length).
+
+    Returns: numpy.ndarray
+    Array of dtype `S8` of the new codes
+    """
+    addr, _, compare = decode_codes(codes)
+    result = encode_codes(addr, value, np.maximum(compare, 0))
+    short = compare < 0
+    if short.any():
+        result[short] = encode_codes(addr[short], value)
+    return result
+
+
+def random_codes(count, length=6, start=0x8000, end=0x10000, rng=None):
+    """
+    Creates COUNT random codes of LENGTH (6 or 8) letters, patching addresses
+    from START up to END, eg. just one PRG bank window. RNG is a seed or a
+    `numpy.random.Generator`.
+
+    Returns: numpy.ndarray
+    Array of dtype `S6` or `S8`
+    """
+    n = _random_nibbles(count, length, start, end, np.random.default_rng(rng))
+    return _letters[n].view(f'S{length}').reshape(count)
+
+def write_random_codes(stream, count, length=6, start=0x8000, end=0x10000,
+        seed=None, chunk_size=1 << 20):
+    """
+    Writes COUNT random codes (see ::random_codes), one per line, to binary
+    STREAM, CHUNK_SIZE codes at a time. The same SEED gives the same codes.
+    """
+    rng = np.random.default_rng(seed)
+    lines = np.empty((min(count, chunk_size), length + 1), dtype=np.uint8)
+    lines[:, length] = ord('\n')
+    while count > 0:
+        k = min(count, chunk_size)
+        lines[:k, :length] = _letters[
+            _random_nibbles(k, length, start, end, rng)]
+        stream.write(lines[:k].data)
+        count -= k
+
+def _random_nibbles(count, length, start, end, rng):
+    if length not in (6, 8):
+        raise ValueError('Codes must be 6 or 8 letters long')
+    if not 0x8000 <= start < end <= 0x10000:
+        raise ValueError('Addresses must be within $8000-$FFFF')
+    addr, data, compare = _code_table(length)
+    # The data and compare values share one block of random bits
+    bits = rng.integers(0, 1 << 16, count, dtype=np.uint16)
+    n = addr[rng.integers(start - 0x8000, end - 0x8000, count)]
+    n |= data[bits & 0xFF]
+    if length == 8:
+        n |= compare[bits >> 8]
+    return n
+
+_code_tables = {}
+
+def _code_table(length):
+    """
+    Returns: Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]
+    The nibbles of a code of LENGTH letters contributed by each address
+    offset (from $8000), data value and compare value (None for 6 letters)
+    on their own. The nibbles of a code are these OR-ed together.
+    """
+    if length not in _code_tables:
+        compare = 0 if length == 8 else False
+        values = np.arange(256)
+        nibbles = lambda n: np.stack(np.broadcast_arrays(*n), axis=-1) \
+            .astype(np.uint8)
+        _code_tables[length] = (
+            nibbles(_pack_code(np.arange(0x8000), 0, compare)),
+            nibbles(_pack_code(0, values, compare)),
+            nibbles(_pack_code(0, 0, values)) if length == 8 else None,
+        )
+    return _code_tables[length]
+
+
+# Records of the packed binary output format: the code (NUL padded), the
+# address, the value and the compare value (-1 if none), little-endian
+record_dtype = np.dtype([
+    ('code', 'S8'),
+    ('addr', '<u2'),
+    ('value', 'u1'),
+    ('check', '<i2'),
+])
+
+def _table(strings):
+    return np.array([s.encode() for s in strings]).view(np.uint8) \
+        .reshape(len(strings), -1)
+
+_hexdigits = np.frombuffer(b'0123456789abcdef', dtype=np.uint8)
+_dec3 = _table([str(x) for x in range(256)])
+# Indexed by compare + 1
+_text_check = _table([''] + [f', check={x}' for x in range(256)])
+_tsv_check = _table([''] + [str(x) for x in range(256)])
+_json_check = _table(['null'] + [str(x) for x in range(256)])
+
+def _hex4(values):
+    shifts = np.array([12, 8, 4, 0])
+    return _hexdigits[(values.astype(np.int32)[:, None] >> shifts) & 0xF]
+
+def _dec5(values):
+    powers = np.array([10000, 1000, 100, 10, 1])
+    digits = values.astype(np.int32)[:, None] // powers % 10
+    # Blank out the leading zeros, but keep the last digit
+    blank = np.cumsum(digits, axis=1) == 0
+    blank[:, -1] = False
+    return np.where(blank, 0, digits + ord('0')).astype(np.uint8)
+
+def format_codes(codes, addr, data, compare, format='tsv'):
+    """
+    Renders code details, as returned from ::decode_codes, to bytes in one of
+    the following formats, one record per code:
+
+        text    CODE => addr=0xADDR, value=N[, check=N]
+        tsv     CODE <tab> 0xADDR <tab> VALUE <tab> CHECK (empty if none)
+        jsonl   {"code": .., "addr": .., "value": .., "check": .. or null}
+        bin     packed records of ::record_dtype
+
+    Returns: bytes
+    """
+    codes = np.asarray(codes).astype('S8')
+    if format == 'bin':
+        records = np.empty(len(codes), dtype=record_dtype)
+        records['code'] = codes
+        records['addr'] = addr
+        records['value'] = data
+        records['check'] = compare
+        return records.tobytes()
+
+    code = codes.view(np.uint8).reshape(-1, 8)
+    check = compare.astype(np.int32) + 1
+    if format == 'text':
+        fields = [code, b' => addr=0x', _hex4(addr), b', value=', _dec3[data],
+            _text_check[check]]
+    elif format == 'tsv':
+        fields = [code, b'\t0x', _hex4(addr), b'\t', _dec3[data], b'\t',
+            _tsv_check[check]]
+    elif format == 'jsonl':
+        fields = [b'{"code": "', code, b'", "addr": ', _dec5(addr),
+            b', "value": ', _dec3[data], b', "check": ', _json_check[check],
+            b'}']
+    else:
+        raise ValueError(f'Unsupported format: {format}')
+    fields.append(b'\n')
+
+    # Lay out all the fields in a fixed-width table, NUL padded, and then
+    # squeeze out the padding in one go
+    columns = [
+        np.broadcast_to(np.frombuffer(f, dtype=np.uint8), (len(code), len(f)))
+        if isinstance(f, bytes) else f
+        for f in fields
+    ]
+    table = np.concatenate(columns, axis=1)
+    return table[table != 0].tobytes()
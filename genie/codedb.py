@@ -0,0 +1,177 @@
+"""
+A database of codes kept as packed arrays sorted by address, for large
+collections of codes. Requires NumPy.
+"""
+import struct
+
+import numpy as np
+
+from .batch import decode_codes, encode_codes, read_codes, valid_codes
+
+
+class CodeDB:
+    """
+    Codes as four flat arrays, sorted by address (and then compare value and
+    data), which doubles as the index of the addresses: `addr`, `data`,
+    `compare` (-1 for 6-letter codes) and `flags`, eight bits free for the
+    user, eg. to mark codes known to work.
+
+    The binary format is a short header and the four arrays, little-endian,
+    at 6 bytes per code.
+    """
+    MAGIC = b'GGDB'
+    VERSION = 1
+
+    def __init__(self, addr=(), data=(), compare=(), flags=0):
+        addr = np.asarray(addr, dtype=np.uint16)
+        arrays = np.broadcast_arrays(addr, np.asarray(data, dtype=np.uint8),
+            np.asarray(compare, dtype=np.int16),
+            np.asarray(flags, dtype=np.uint8))
+        order = np.lexsort((arrays[1], arrays[2], arrays[0]))
+        self.addr, self.data, self.compare, self.flags = (
+            A[order] for A in arrays)
+
+    @classmethod
+    def from_codes(cls, codes, flags=0):
+        """
+        Builds the database of CODES (see ::decode_codes)
+        """
+        return cls(*decode_codes(codes), flags)
+
+    @classmethod
+    def read(cls, stream, chunk_size=1 << 20, invalid=None):
+        """
+        Builds the database of the whitespace-separated codes of binary
+        STREAM (see ::read_codes). If INVALID is given, invalid codes are
+        skipped and passed to it with their line number, otherwise they
+        raise ValueError.
+        """
+        parts = []
+        for codes, lines in read_codes(stream, chunk_size, lines=True):
+            if invalid is not None:
+                valid = valid_codes(codes)
+                for code, line in zip(codes[~valid].tolist(),
+                        lines[~valid].tolist()):
+                    invalid(code, line)
+                codes = codes[valid]
+            parts.append(decode_codes(codes))
+        if not parts:
+            return cls()
+        return cls(*(np.concatenate(A) for A in zip(*parts)))
+
+    def __len__(self):
+        return len(self.addr)
+
+    def __add__(self, other):
+        return CodeDB(*(np.concatenate((A, B)) for A, B in zip(
+            self.arrays(), other.arrays())))
+
+    def arrays(self):
+        return self.addr, self.data, self.compare, self.flags
+
+    def _subset(self, index):
+        result = CodeDB.__new__(CodeDB)
+        result.addr, result.data, result.compare, result.flags = (
+            A[index] for A in self.arrays())
+        return result
+
+    def codes(self):
+        """
+        Returns: numpy.ndarray
+        The codes, of dtype `S8`; 6-letter codes are NUL padded
+        """
+        long = self.compare >= 0
+        result = np.zeros(len(self), dtype='S8')
+        result[long] = encode_codes(self.addr[long], self.data[long],
+            self.compare[long])
+        result[~long] = encode_codes(self.addr[~long], self.data[~long])
+        return result
+
+    def range(self, start, end):
+        """
+        Returns: CodeDB
+        The codes patching addresses from START up to END, found by binary
+        search
+        """
+        first, last = np.searchsorted(self.addr, (start, end))
+        return self._subset(slice(first, last))
+
+    def lookup(self, addr):
+        """
+        Returns: CodeDB
+        The codes patching ADDR
+        """
+        return self.range(addr, addr + 1)
+
+    def duplicates(self):
+        """
+        Returns: CodeDB
+        The codes which repeat an earlier one (flags aside)
+        """
+        return self._subset(np.flatnonzero(self._same(
+            self.addr, self.compare, self.data)) + 1)
+
+    def unique(self):
+        """
+        Returns: CodeDB
+        The codes without the ::duplicates, keeping the first of each
+        """
+        keep = np.ones(len(self), dtype=bool)
+        keep[1:] = ~self._same(self.addr, self.compare, self.data)
+        return self._subset(keep)
+
+    def conflicts(self):
+        """
+        Finds the addresses patched by codes which disagree on the value or
+        the compare byte, in one pass over the sorted arrays.
+
+        Returns: CodeDB
+        All the codes (duplicates included) patching those addresses
+        """
+        differ = self._same(self.addr) \
+            & ~self._same(self.addr, self.compare, self.data)
+        bad = np.unique(self.addr[1:][differ])
+        return self._subset(np.isin(self.addr, bad))
+
+    @staticmethod
+    def _same(*arrays):
+        # Whether each row of the sorted ARRAYS equals the one before
+        same = np.ones(max(len(arrays[0]) - 1, 0), dtype=bool)
+        for A in arrays:
+            same &= A[1:] == A[:-1]
+        return same
+
+    def tobytes(self):
+        return b''.join((
+            struct.pack('<4sHHI', self.MAGIC, self.VERSION, 0, len(self)),
+            self.addr.astype('<u2').tobytes(),
+            self.data.tobytes(),
+            self.compare.astype('<i2').tobytes(),
+            self.flags.tobytes(),
+        ))
+
+    @classmethod
+    def frombytes(cls, data):
+        magic, version, _, count = struct.unpack_from('<4sHHI', data)
+        if magic != cls.MAGIC or version != cls.VERSION:
+            raise ValueError('Not a (current) code database')
+        offset = struct.calcsize('<4sHHI')
+        arrays = []
+        for dtype in ('<u2', 'u1', '<i2', 'u1'):
+            dtype = np.dtype(dtype)
+            arrays.append(np.frombuffer(data, dtype, count, offset)
+                .astype(dtype.newbyteorder('=')))
+            offset += count * dtype.itemsize
+        # Saved sorted, so no need to sort again
+        result = cls.__new__(cls)
+        result.addr, result.data, result.compare, result.flags = arrays
+        return result
+
+    def save(self, path):
+        with open(path, 'wb') as file:
+            file.write(self.tobytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as file:
+            return cls.frombytes(file.read())
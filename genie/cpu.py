@@ -0,0 +1,570 @@
+"""
+A compact, headless 6502 interpreter for screening codes: a ROM is run for
+a number of frames with codes applied, and obvious crashes are reported.
+
+Only the CPU is emulated. The PPU is reduced to its vertical blank flag and
+NMI, so that the usual "wait for vblank" loops make progress, and the APU
+and controllers read as zero. The PRG ROM is mapped as the mapper has it
+at power on (see ::BankMap.initial); bank switching isn't emulated.
+"""
+from typing import NamedTuple
+
+from . import code_to_data_addr
+from .decompile import AddressingScheme, Opcodes
+from .decompile import NMI_VECTOR, RESET_VECTOR, IRQ_VECTOR
+from .rom import Rom, open_rom
+
+# NTSC timing, in CPU cycles
+CYCLES_PER_FRAME = 29781
+VBLANK_CYCLES = 2273
+
+# Kinds of crash
+INVALID_OPCODE = 'invalid opcode'
+BRK_LOOP = 'BRK loop'
+RUNAWAY_PC = 'runaway PC'
+
+
+class Result(NamedTuple):
+    crash:          str     # kind of crash, or None
+    pc:             int     # PC at the end of the run (or of the crash)
+    instructions:   int
+    frames:         int
+    reached:        bool = True     # False if the code's byte was never read
+
+
+class Patch(NamedTuple):
+    addr:       int
+    data:       int
+    compare:    int = None
+
+
+class CPU:
+    """
+    6502 CPU with a flat 64k memory map. Internal RAM lives at $0000-$07FF
+    (mirrored up to $1FFF), PRG RAM at $6000-$7FFF and the PRG ROM window at
+    $8000-$FFFF. Game Genie PATCHES are applied to the ROM window whenever
+    it is mapped (see ::map_prg), honoring their compare values.
+    """
+    __slots__ = ('mem', 'a', 'x', 'y', 's', 'pc', 'c', 'z', 'n', 'v', 'i',
+        'd', 'cycles', 'nmi_enabled', 'vblank', 'patches', 'touched')
+
+    def __init__(self, prg, patches=(), touched=None):
+        # NOTE: Padded for operands fetched past $FFFF
+        self.mem = bytearray(0x10000 + 2)
+        self.patches = [Patch(*P) for P in patches]
+        # Optional bytearray(0x10000 + 2) marking each ROM byte read, from
+        # the reset vector on
+        self.touched = touched
+        self.map_prg(prg)
+        self.reset()
+
+    def map_prg(self, prg):
+        """
+        Maps PRG (up to 32k, mirrored if shorter) at $8000-$FFFF and applies
+        the patches to it.
+        """
+        prg = bytes(prg[:0x8000]) or b'\0'
+        self.mem[0x8000:0x10000] = (prg * (0x8000 // len(prg) + 1))[:0x8000]
+        for addr, data, compare in self.patches:
+            if compare is None or self.mem[addr] == compare:
+                self.mem[addr] = data
+
+    def reset(self):
+        self.a = self.x = self.y = 0
+        self.s = 0xFD
+        self.c = self.v = self.d = 0
+        self.i = 1
+        self.z = 1
+        self.n = 0
+        self.cycles = 0
+        self.nmi_enabled = False
+        self.vblank = False
+        self.pc = self.read16(RESET_VECTOR)
+
+    # Memory map
+
+    def read(self, addr):
+        if addr >= 0x6000:
+            if addr >= 0x8000 and self.touched is not None:
+                self.touched[addr] = 1
+            return self.mem[addr]
+        elif addr < 0x2000:
+            return self.mem[addr & 0x7FF]
+        elif addr < 0x4000:
+            if addr & 7 == 2:
+                # PPUSTATUS: reading clears the vblank flag
+                status = 0x80 if self.vblank else 0
+                self.vblank = False
+                return status
+            return 0
+        return 0
+
+    def write(self, addr, value):
+        if addr < 0x2000:
+            self.mem[addr & 0x7FF] = value
+        elif addr < 0x4000:
+            if addr & 7 == 0:
+                # PPUCTRL
+                self.nmi_enabled = bool(value & 0x80)
+        elif addr < 0x6000:
+            if addr == 0x4014:
+                # OAM DMA stalls the CPU
+                self.cycles += 513
+        elif addr < 0x8000:
+            self.mem[addr] = value
+        # NOTE: Writes to ROM (mapper registers) are ignored
+
+    def read16(self, addr):
+        return self.read(addr) | (self.read((addr + 1) & 0xFFFF) << 8)
+
+    def push(self, value):
+        self.mem[0x100 + self.s] = value
+        self.s = (self.s - 1) & 0xFF
+
+    def pull(self):
+        self.s = (self.s + 1) & 0xFF
+        return self.mem[0x100 + self.s]
+
+    @property
+    def p(self):
+        return ((self.n & 0x80) | (self.v << 6) | 0x20 | (self.d << 3)
+            | (self.i << 2) | ((self.z == 0) << 1) | self.c)
+
+    @p.setter
+    def p(self, value):
+        self.n = value & 0x80
+        self.v = (value >> 6) & 1
+        self.d = (value >> 3) & 1
+        self.i = (value >> 2) & 1
+        self.z = 0 if value & 2 else 1
+        self.c = value & 1
+
+    def interrupt(self, vector, brk=False):
+        self.push(self.pc >> 8)
+        self.push(self.pc & 0xFF)
+        self.push(self.p | (0x10 if brk else 0))
+        self.i = 1
+        self.pc = self.read16(vector)
+        self.cycles += 7
+
+    def state(self):
+        """
+        Returns: tuple
+        Everything the rest of a run depends on, but the ROM
+        """
+        return (self.a, self.x, self.y, self.s, self.pc, self.c, self.z,
+            self.n, self.v, self.i, self.d, self.cycles, self.nmi_enabled,
+            self.vblank, bytes(self.mem[:0x800]),
+            bytes(self.mem[0x6000:0x8000]))
+
+    # Execution
+
+    def run(self, instructions=None, frames=None, brk_limit=2,
+            on_frame=None):
+        """
+        Runs until INSTRUCTIONS have been executed or FRAMES have passed
+        (whichever comes first), or the program crashes. ON_FRAME is called
+        with the frame number and the instructions executed at the start of
+        each vertical blank, and the run stops if it returns true.
+
+        Returns: Result
+        """
+        if instructions is None and frames is None:
+            raise ValueError('Specify a number of instructions and/or frames')
+        limit = instructions if instructions is not None else float('inf')
+        end = (frames * CYCLES_PER_FRAME if frames is not None
+            else float('inf'))
+
+        mem, table = self.mem, _dispatch
+        count = frame = 0
+        next_frame = CYCLES_PER_FRAME - VBLANK_CYCLES
+        vblank_end = float('inf')
+        brks = {}
+        crash = None
+        while count < limit and self.cycles < end:
+            pc = self.pc
+            if 0x0800 <= pc < 0x6000:
+                # Not RAM nor ROM
+                crash = RUNAWAY_PC
+                break
+
+            opcode = mem[pc]
+            entry = table[opcode]
+            if entry is None:
+                crash = INVALID_OPCODE
+                break
+            execute, mode, length, cycles = entry
+            if self.touched is not None and pc >= 0x8000:
+                self.touched[pc:pc + length] = b'\1' * length
+
+            if opcode == 0x00:
+                brks[pc] = brks.get(pc, 0) + 1
+                if brks[pc] >= brk_limit:
+                    crash = BRK_LOOP
+                    break
+
+            self.pc = (pc + length) & 0xFFFF
+            execute(self, mode(self, mem, pc))
+            self.cycles += cycles
+            count += 1
+
+            if self.cycles >= next_frame:
+                # Start of vertical blank
+                frame += 1
+                self.vblank = True
+                vblank_end = next_frame + VBLANK_CYCLES
+                next_frame += CYCLES_PER_FRAME
+                if self.nmi_enabled:
+                    self.interrupt(NMI_VECTOR)
+                if on_frame is not None and on_frame(frame, count):
+                    break
+            elif self.cycles >= vblank_end:
+                self.vblank = False
+                vblank_end = float('inf')
+
+        return Result(crash, self.pc, count, frame)
+
+
+# Addressing modes. Each resolves the effective address of the instruction
+# at PC (or the branch target, or None for none).
+
+def _implied(cpu, mem, pc):
+    return None
+
+def _immediate(cpu, mem, pc):
+    return pc + 1
+
+def _zero_page(cpu, mem, pc):
+    return mem[pc + 1]
+
+def _zero_page_x(cpu, mem, pc):
+    return (mem[pc + 1] + cpu.x) & 0xFF
+
+def _zero_page_y(cpu, mem, pc):
+    return (mem[pc + 1] + cpu.y) & 0xFF
+
+def _absolute(cpu, mem, pc):
+    return mem[pc + 1] | (mem[pc + 2] << 8)
+
+def _absolute_x(cpu, mem, pc):
+    return ((mem[pc + 1] | (mem[pc + 2] << 8)) + cpu.x) & 0xFFFF
+
+def _absolute_y(cpu, mem, pc):
+    return ((mem[pc + 1] | (mem[pc + 2] << 8)) + cpu.y) & 0xFFFF
+
+def _indirect(cpu, mem, pc):
+    # NOTE: The pointer does not carry into the high byte (6502 bug)
+    ptr = mem[pc + 1] | (mem[pc + 2] << 8)
+    return cpu.read(ptr) | (cpu.read((ptr & 0xFF00) | ((ptr + 1) & 0xFF)) << 8)
+
+def _indirect_x(cpu, mem, pc):
+    zp = (mem[pc + 1] + cpu.x) & 0xFF
+    return mem[zp] | (mem[(zp + 1) & 0xFF] << 8)
+
+def _indirect_y(cpu, mem, pc):
+    zp = mem[pc + 1]
+    return ((mem[zp] | (mem[(zp + 1) & 0xFF] << 8)) + cpu.y) & 0xFFFF
+
+def _relative(cpu, mem, pc):
+    offset = mem[pc + 1]
+    return (pc + 2 + offset - ((offset & 0x80) << 1)) & 0xFFFF
+
+_mode_functions = {
+    id(AddressingScheme.Accumulator):   _implied,
+    id(AddressingScheme.Implied):       _implied,
+    id(AddressingScheme.Immediate):     _immediate,
+    id(AddressingScheme.ZeroPage):      _zero_page,
+    id(AddressingScheme.ZeroPage_X):    _zero_page_x,
+    id(AddressingScheme.Absolute):      _absolute,
+    id(AddressingScheme.Absolute_X):    _absolute_x,
+    id(AddressingScheme.Absolute_Y):    _absolute_y,
+    id(AddressingScheme.Indirect):      _indirect,
+    id(AddressingScheme.Indirect_X):    _indirect_x,
+    id(AddressingScheme.Indirect_Y):    _indirect_y,
+    id(AddressingScheme.Relative):      _relative,
+}
+
+
+# Instructions, by mnemonic. Each takes the CPU and the effective address.
+
+def _adc(cpu, addr, m=None):
+    if m is None:
+        m = cpu.read(addr)
+    a = cpu.a
+    s = a + m + cpu.c
+    cpu.v = 1 if ~(a ^ m) & (a ^ s) & 0x80 else 0
+    cpu.c = 1 if s > 0xFF else 0
+    cpu.a = cpu.z = cpu.n = s & 0xFF
+
+def _sbc(cpu, addr):
+    _adc(cpu, addr, cpu.read(addr) ^ 0xFF)
+
+def _and(cpu, addr):
+    cpu.a = cpu.z = cpu.n = cpu.a & cpu.read(addr)
+
+def _ora(cpu, addr):
+    cpu.a = cpu.z = cpu.n = cpu.a | cpu.read(addr)
+
+def _eor(cpu, addr):
+    cpu.a = cpu.z = cpu.n = cpu.a ^ cpu.read(addr)
+
+def _bit(cpu, addr):
+    m = cpu.read(addr)
+    cpu.z = cpu.a & m
+    cpu.n = m
+    cpu.v = (m >> 6) & 1
+
+def _compare(register):
+    def compare(cpu, addr):
+        r, m = getattr(cpu, register), cpu.read(addr)
+        cpu.c = 1 if r >= m else 0
+        cpu.z = cpu.n = (r - m) & 0xFF
+    return compare
+
+def _load(register):
+    def load(cpu, addr):
+        value = cpu.read(addr)
+        setattr(cpu, register, value)
+        cpu.z = cpu.n = value
+    return load
+
+def _store(register):
+    def store(cpu, addr):
+        cpu.write(addr, getattr(cpu, register))
+    return store
+
+def _modify(operation):
+    # Read-modify-write on memory, or the accumulator if there's no address
+    def modify(cpu, addr):
+        if addr is None:
+            cpu.a = cpu.z = cpu.n = operation(cpu, cpu.a)
+        else:
+            value = cpu.z = cpu.n = operation(cpu, cpu.read(addr))
+            cpu.write(addr, value)
+    return modify
+
+def _asl(cpu, value):
+    cpu.c = value >> 7
+    return (value << 1) & 0xFF
+
+def _lsr(cpu, value):
+    cpu.c = value & 1
+    return value >> 1
+
+def _rol(cpu, value):
+    value = (value << 1) | cpu.c
+    cpu.c = value >> 8
+    return value & 0xFF
+
+def _ror(cpu, value):
+    value, cpu.c = (value >> 1) | (cpu.c << 7), value & 1
+    return value
+
+def _inc(cpu, value):
+    return (value + 1) & 0xFF
+
+def _dec(cpu, value):
+    return (value - 1) & 0xFF
+
+def _step(register, delta):
+    def step(cpu, addr):
+        value = cpu.z = cpu.n = (getattr(cpu, register) + delta) & 0xFF
+        setattr(cpu, register, value)
+    return step
+
+def _transfer(source, target, flags=True):
+    def transfer(cpu, addr):
+        value = getattr(cpu, source)
+        setattr(cpu, target, value)
+        if flags:
+            cpu.z = cpu.n = value
+    return transfer
+
+def _flag(flag, value):
+    def set_flag(cpu, addr):
+        setattr(cpu, flag, value)
+    return set_flag
+
+def _branch(condition):
+    def branch(cpu, target):
+        if condition(cpu):
+            cpu.pc = target
+            cpu.cycles += 1
+    return branch
+
+def _jmp(cpu, addr):
+    cpu.pc = addr
+
+def _jsr(cpu, addr):
+    ret = (cpu.pc - 1) & 0xFFFF
+    cpu.push(ret >> 8)
+    cpu.push(ret & 0xFF)
+    cpu.pc = addr
+
+def _rts(cpu, addr):
+    lo = cpu.pull()
+    cpu.pc = ((cpu.pull() << 8 | lo) + 1) & 0xFFFF
+
+def _rti(cpu, addr):
+    cpu.p = cpu.pull()
+    lo = cpu.pull()
+    cpu.pc = cpu.pull() << 8 | lo
+
+def _brk(cpu, addr):
+    cpu.pc = (cpu.pc + 1) & 0xFFFF
+    cpu.interrupt(IRQ_VECTOR, brk=True)
+
+def _pha(cpu, addr):
+    cpu.push(cpu.a)
+
+def _php(cpu, addr):
+    cpu.push(cpu.p | 0x10)
+
+def _pla(cpu, addr):
+    cpu.a = cpu.z = cpu.n = cpu.pull()
+
+def _plp(cpu, addr):
+    cpu.p = cpu.pull()
+
+def _nop(cpu, addr):
+    pass
+
+_mnemonic_functions = {
+    'ADC': _adc, 'SBC': _sbc, 'AND': _and, 'ORA': _ora, 'EOR': _eor,
+    'BIT': _bit,
+    'CMP': _compare('a'), 'CPX': _compare('x'), 'CPY': _compare('y'),
+    'LDA': _load('a'), 'LDX': _load('x'), 'LDY': _load('y'),
+    'STA': _store('a'), 'STX': _store('x'), 'STY': _store('y'),
+    'ASL': _modify(_asl), 'LSR': _modify(_lsr), 'ROL': _modify(_rol),
+    'ROR': _modify(_ror), 'INC': _modify(_inc), 'DEC': _modify(_dec),
+    'INX': _step('x', 1), 'INY': _step('y', 1),
+    'DEX': _step('x', -1), 'DEY': _step('y', -1),
+    'TAX': _transfer('a', 'x'), 'TAY': _transfer('a', 'y'),
+    'TXA': _transfer('x', 'a'), 'TYA': _transfer('y', 'a'),
+    'TSX': _transfer('s', 'x'), 'TXS': _transfer('x', 's', flags=False),
+    'CLC': _flag('c', 0), 'SEC': _flag('c', 1),
+    'CLI': _flag('i', 0), 'SEI': _flag('i', 1),
+    'CLD': _flag('d', 0), 'SED': _flag('d', 1), 'CLV': _flag('v', 0),
+    'BCC': _branch(lambda cpu: not cpu.c),
+    'BCS': _branch(lambda cpu: cpu.c),
+    'BNE': _branch(lambda cpu: cpu.z != 0),
+    'BEQ': _branch(lambda cpu: cpu.z == 0),
+    'BPL': _branch(lambda cpu: not cpu.n & 0x80),
+    'BMI': _branch(lambda cpu: cpu.n & 0x80),
+    'BVC': _branch(lambda cpu: not cpu.v),
+    'BVS': _branch(lambda cpu: cpu.v),
+    'JMP': _jmp, 'JSR': _jsr, 'RTS': _rts, 'RTI': _rti, 'BRK': _brk,
+    'PHA': _pha, 'PHP': _php, 'PLA': _pla, 'PLP': _plp, 'NOP': _nop,
+}
+
+def _cycles(mnemonic, mode):
+    # Base cycle count of an instruction, page crossings aside
+    if mnemonic in ('JSR', 'RTS', 'RTI'):
+        return 6
+    elif mnemonic == 'BRK':
+        return 7
+    elif mnemonic == 'JMP':
+        return 5 if mode is AddressingScheme.Indirect else 3
+    elif mnemonic in ('PHA', 'PHP'):
+        return 3
+    elif mnemonic in ('PLA', 'PLP'):
+        return 4
+
+    rmw = mnemonic in ('ASL', 'LSR', 'ROL', 'ROR', 'INC', 'DEC')
+    store = mnemonic in ('STA', 'STX', 'STY')
+    if mode is AddressingScheme.ZeroPage:
+        return 5 if rmw else 3
+    elif mode is AddressingScheme.ZeroPage_X:
+        return 6 if rmw else 4
+    elif mode is AddressingScheme.Absolute:
+        return 6 if rmw else 4
+    elif mode is AddressingScheme.Absolute_X \
+            or mode is AddressingScheme.Absolute_Y:
+        return 7 if rmw else 5 if store else 4
+    elif mode is AddressingScheme.Indirect_X:
+        return 6
+    elif mode is AddressingScheme.Indirect_Y:
+        return 6 if store else 5
+    return 2
+
+def _build_dispatch():
+    table = [None] * 256
+    for op in Opcodes:
+        mnemonic = op.name.split('_')[0]
+        opcode, mode = op.value.opcode, op.value.address_type
+        function = _mode_functions[id(mode)]
+        if mnemonic in ('LDX', 'STX'):
+            # Indexed by Y, not X as the opcode table has it
+            if mode is AddressingScheme.ZeroPage_X:
+                function = _zero_page_y
+            elif mode is AddressingScheme.Absolute_X:
+                function = _absolute_y
+        table[opcode] = (_mnemonic_functions[mnemonic], function,
+            1 + mode.addr_bytes, _cycles(mnemonic, mode))
+    return table
+
+_dispatch = _build_dispatch()
+
+
+def run_rom(rom, codes=(), instructions=None, frames=60):
+    """
+    Runs ROM (a path or ::Rom) from reset with the Game Genie CODES applied.
+
+    Returns: Result
+    """
+    if not isinstance(rom, Rom):
+        rom = open_rom(rom)
+    cpu = CPU(rom.banks.initial(rom.prg),
+        [code_to_data_addr(code) for code in codes])
+    return cpu.run(instructions, frames)
+
+
+def screen_codes(rom, codes, instructions=None, frames=60):
+    """
+    Runs ROM (a path or ::Rom) once for each of CODES, applied one at a
+    time. The ROM is first run without any code, recording which of its
+    bytes are read in each frame and the state at the start of each frame.
+    Codes patching bytes which are never read cannot change the run and are
+    not run again, but reported as not reached. The run of a code ends
+    early, as the run without codes, once its state is back to that of the
+    run without codes at the start of a frame after which the byte isn't
+    read again.
+
+    Returns: Dict[str, Result]
+    """
+    if not isinstance(rom, Rom):
+        rom = open_rom(rom)
+    prg = rom.banks.initial(rom.prg)
+    baseline = CPU(prg, touched=bytearray(0x10000 + 2))
+    # The bytes read from the start of each frame (and before the first)
+    reads, states = [], []
+    def record(frame, count):
+        reads.append(baseline.touched)
+        baseline.touched = bytearray(0x10000 + 2)
+        states.append((count, baseline.state()))
+    clean = baseline.run(instructions, frames, on_frame=record)
+    reads.append(baseline.touched)
+    unreached = clean._replace(reached=False)
+
+    results = {}
+    for code in codes:
+        addr, data, compare = code_to_data_addr(code)
+        if not any(R[addr] for R in reads):
+            results[code] = unreached
+            continue
+        if compare is not None and prg[addr - 0x8000] != compare:
+            # Not applied
+            results[code] = clean
+            continue
+
+        cpu = CPU(prg, [(addr, data, compare)])
+        settled = False
+        def check(frame, count):
+            nonlocal settled
+            settled = frame <= len(states) \
+                and not any(R[addr] for R in reads[frame:]) \
+                and states[frame - 1] == (count, cpu.state())
+            return settled
+        result = cpu.run(instructions, frames, on_frame=check)
+        results[code] = clean if settled else result
+    return results
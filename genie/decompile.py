@@ -1,6 +1,9 @@
+from array import array
 from enum import Enum
 from typing import Dict, NamedTuple
 
+from .mapper import PAGE_SIZE
+
 
 class AddressType(NamedTuple):
     addr_bytes: int
@@ -45,16 +48,19 @@ class Opcode(NamedTuple):
                 raise ValueError('Opcode does not take an argument')
             return OpcodeInstance(self)
         
-        return self.for_data(chr(addr & 0xff).encode())
+        return self.for_data(bytes((addr & 0xff,)))
 
     def for_data(self, data: bytes):
         return OpcodeInstance(self, data)
 
 
 class OpcodeInstance:
+    __slots__ = ('opcode', 'data', '_bytes')
+
     def __init__(self, opcode: Opcode, data: bytes=None):
         self.opcode = opcode
-        self.data = data or b''
+        self.data = bytes(data) if data else b''
+        self._bytes = None
 
     def __add__(self, other):
         return OpcodeSequence(self) + other
@@ -64,7 +70,9 @@ class OpcodeInstance:
         return self.address_type.target_of(pc)
 
     def tobytes(self):
-        return bytes((self.opcode.opcode,)) + self.data
+        if self._bytes is None:
+            self._bytes = bytes((self.opcode.opcode,)) + self.data
+        return self._bytes
 
 
 class Opcodes(Enum):
@@ -153,7 +161,7 @@ class Opcodes(Enum):
     INY     = Opcode(0xC8)
 
     JMP_A   = Opcode(0x4C, AddressingScheme.Absolute, is_branch=True)
-    JMP_I   = Opcode(0x4C, AddressingScheme.Indirect, is_branch=True)
+    JMP_I   = Opcode(0x6C, AddressingScheme.Indirect, is_branch=True)
 
     JSR     = Opcode(0x20, AddressingScheme.Absolute, is_branch=True)
 
@@ -204,13 +212,13 @@ class Opcodes(Enum):
     ROL_ZP  = Opcode(0x26, AddressingScheme.ZeroPage)
     ROL_ZX  = Opcode(0x36, AddressingScheme.ZeroPage_X)
     ROL_A   = Opcode(0x2E, AddressingScheme.Absolute)
-    ROL_AX  = Opcode(0x2E, AddressingScheme.Absolute_X)
+    ROL_AX  = Opcode(0x3E, AddressingScheme.Absolute_X)
 
     ROR     = Opcode(0x6A, AddressingScheme.Accumulator)
     ROR_ZP  = Opcode(0x66, AddressingScheme.ZeroPage)
     ROR_ZX  = Opcode(0x76, AddressingScheme.ZeroPage_X)
     ROR_A   = Opcode(0x6E, AddressingScheme.Absolute)
-    ROR_AX  = Opcode(0x6E, AddressingScheme.Absolute_X)
+    ROR_AX  = Opcode(0x7E, AddressingScheme.Absolute_X)
 
     RTI     = Opcode(0x40)
     RTS     = Opcode(0x60)
@@ -258,26 +266,44 @@ class Opcodes(Enum):
         return bytes((self.value.opcode,))
 
 
-class OpcodeSequence(list):
-    def __init__(self, first):
-        self.ops = [first]
-        self.next = None
+class OpcodeSequence:
+    """
+    A flat run of instructions (::OpcodeInstance). Adding a sequence to
+    another copies its instructions rather than linking to it.
+    """
+    __slots__ = ('ops', '_bytes')
+
+    def __init__(self, first=None):
+        self.ops = [] if first is None else [first]
+        self._bytes = None
 
     def __iadd__(self, other):
         if isinstance(other, OpcodeSequence):
-            if self.next is None:
-                self.next = other
-            else:
-                self.next += other
+            self.ops.extend(other.ops)
         else:
             self.ops.append(other)
-
+        self._bytes = None
         return self
 
+    def __add__(self, other):
+        result = OpcodeSequence()
+        result.ops = list(self.ops)
+        result += other
+        return result
+
     def __iter__(self):
-        yield from self.ops
-        if self.next is not None:
-            yield from self.next
+        return iter(self.ops)
+
+    def __len__(self):
+        return len(self.ops)
+
+    def __getitem__(self, index):
+        return self.ops[index]
+
+    def tobytes(self):
+        if self._bytes is None:
+            self._bytes = b''.join(op.tobytes() for op in self.ops)
+        return self._bytes
 
 
 _op_table = {
@@ -285,6 +311,284 @@ _op_table = {
     for op in Opcodes
 }
 
+# Addressing schemes by number, for ::_op_mode. NOTE: some of the schemes
+# compare equal, so this goes by identity.
+_modes = [
+    getattr(AddressingScheme, name) for name in dir(AddressingScheme)
+    if isinstance(getattr(AddressingScheme, name), AddressType)
+]
+
+def _mode_number(scheme):
+    return next(i for i, T in enumerate(_modes) if T is scheme)
+
+_relative = _mode_number(AddressingScheme.Relative)
+
+def _tables(table):
+    """
+    Flattens an opcode TABLE into 256-entry byte tables of the instruction
+    length and addressing mode (number in ::_modes), indexed by opcode.
+    Unknown opcodes have length 1 and mode 0xFF.
+    """
+    length, mode = bytearray([1] * 256), bytearray([0xFF] * 256)
+    for code, op in table.items():
+        length[code] = len(op)
+        mode[code] = _mode_number(op.address_type)
+    return bytes(length), bytes(mode)
+
+_op_length, _op_mode = _tables(_op_table)
+
+# Mnemonics by number, and the mnemonic number of each opcode (0xFF if
+# unknown), eg. `_mnemonics[_op_mnemonic[0xA9]] == 'LDA'`
+_mnemonics = sorted({op.name.split('_')[0] for op in Opcodes})
+_op_mnemonic = bytearray([0xFF] * 256)
+for op in Opcodes:
+    _op_mnemonic[op.value.opcode] = _mnemonics.index(op.name.split('_')[0])
+_op_mnemonic = bytes(_op_mnemonic)
+del op
+
+
+class Disassembly:
+    """
+    Linear disassembly of 6502 code as flat arrays with one entry per
+    instruction: `pc`, its position in the data, `opcode`, the opcode byte,
+    and `operand`, the (little-endian) operand value or 0 if none. Bytes
+    which are not a known opcode are taken as one-byte instructions.
+
+    Iterating yields the same tuples as ::decode.
+    """
+    __slots__ = ('data', 'table', 'pc', 'opcode', 'operand')
+
+    def __init__(self, data, table, pc, opcode, operand):
+        self.data = data
+        self.table = table
+        self.pc = pc
+        self.opcode = opcode
+        self.operand = operand
+
+    def __len__(self):
+        return len(self.pc)
+
+    def __iter__(self):
+        dmv, table = self.data, self.table
+        lengths = _op_length if table is _op_table else _tables(table)[0]
+        for pc, opcode in zip(self.pc, self.opcode):
+            bc = table.get(opcode)
+            if bc is None:
+                yield None, dmv[pc], pc
+            else:
+                yield bc, dmv[pc:pc+lengths[opcode]], pc
+
+
+def disassemble(data: bytes, pc: int=0, end: int=None, *,
+        table: Dict[int, Opcode]=_op_table):
+    """
+    Linear sweep disassembly of DATA from PC to END (default is the end of
+    the data), driven by flat per-opcode tables rather than objects.
+
+    Returns: Disassembly
+    """
+    dmv = memoryview(data)
+    if end is None:
+        end = len(dmv)
+    lengths = _op_length if table is _op_table else _tables(table)[0]
+    # The last instruction may run past END. Padded so that the operands of
+    # an instruction truncated by the end of the data read as zero.
+    base = pc
+    raw = dmv[base:end + 2].tobytes() + b'\0\0'
+
+    pcs, opcodes, operands = array('L'), bytearray(), array('L')
+    add_pc, add_opcode, add_operand = \
+        pcs.append, opcodes.append, operands.append
+    at, stop = 0, end - base
+    while at < stop:
+        opcode = raw[at]
+        length = lengths[opcode]
+        add_pc(base + at)
+        add_opcode(opcode)
+        if length == 1:
+            add_operand(0)
+        elif length == 2:
+            add_operand(raw[at + 1])
+        else:
+            add_operand(raw[at + 1] | raw[at + 2] << 8)
+        at += length
+
+    return Disassembly(dmv, table, pcs, bytes(opcodes), operands)
+
+
+# Flags of the code map from ::trace
+CODE        = 1     # byte is part of a reachable instruction
+CODE_START  = 2     # byte is the opcode of a reachable instruction
+
+# Interrupt vectors
+NMI_VECTOR      = 0xFFFA
+RESET_VECTOR    = 0xFFFC
+IRQ_VECTOR      = 0xFFFE
+
+def trace(data: bytes, entries=None, *, base: int=0x8000,
+        table: Dict[int, Opcode]=_op_table):
+    """
+    Recursive descent disassembly: follows the flow of control of 6502 code
+    from the ENTRIES points, through branches, jumps and subroutine calls,
+    and marks the bytes of every reachable instruction.
+
+    Parameters:
+    data: bytes
+        Code mapped at CPU address BASE. If the data is shorter than the
+        window from BASE to $FFFF, it is mirrored to fill it (as for 16k PRG
+        ROMs).
+    entries: Iterable[int] = None
+        CPU addresses to start from. Default is the addresses in the NMI,
+        reset and IRQ vectors at the top of the memory.
+
+    Returns: bytearray
+    A code map with a byte of ::CODE and ::CODE_START flags for each byte of
+    DATA. Bytes not flagged are data, or at least unreachable.
+    """
+    dmv = memoryview(data)
+    size = len(dmv)
+    flags = bytearray(size)
+    if not size:
+        return flags
+
+    def offset(addr):
+        if base <= addr <= 0xFFFF:
+            return (addr - base) % size
+
+    def read16(addr):
+        lo, hi = offset(addr), offset(addr + 1)
+        if lo is None or hi is None:
+            return None
+        return dmv[lo] | (dmv[hi] << 8)
+
+    if entries is None:
+        entries = (read16(V) for V in (NMI_VECTOR, RESET_VECTOR, IRQ_VECTOR))
+
+    lengths, modes = (_op_length, _op_mode) if table is _op_table \
+        else _tables(table)
+    stops = {Opcodes.RTS.value.opcode, Opcodes.RTI.value.opcode,
+        Opcodes.BRK.value.opcode, Opcodes.JMP_I.value.opcode}
+    jump, call = Opcodes.JMP_A.value.opcode, Opcodes.JSR.value.opcode
+
+    work = [E for E in entries if E is not None]
+    while work:
+        pc = work.pop()
+        while True:
+            at = offset(pc)
+            if at is None or flags[at] & CODE_START:
+                break
+            opcode = dmv[at]
+            length = lengths[opcode]
+            if modes[opcode] == 0xFF or at + length > size:
+                break
+            if any(flags[at:at + length]):
+                # Overlaps another instruction; the flow has gone astray
+                break
+
+            flags[at] = CODE | CODE_START
+            flags[at + 1:at + length] = bytes((CODE,)) * (length - 1)
+            if opcode in stops:
+                break
+
+            if length == 3:
+                operand = dmv[at + 1] | dmv[at + 2] << 8
+            elif length == 2:
+                operand = dmv[at + 1]
+            pc += length
+            if opcode == jump:
+                pc = operand
+            elif opcode == call:
+                work.append(operand)
+            elif modes[opcode] == _relative:
+                # Relative branch, the operand is signed
+                work.append((pc + operand - (operand & 0x80) * 2) & 0xFFFF)
+
+    return flags
+
+def trace_banks(prg: bytes, banks, entries=None, *,
+        table: Dict[int, Opcode]=_op_table):
+    """
+    Like ::trace, but over a whole PRG ROM of which a mapper switches banks
+    into $8000-$FFFF. The flow stays in the bank it is in within an 8k page,
+    and continues in every bank which may be switched in when it leaves it.
+
+    Parameters:
+    banks: BankMap
+        Where the PRG ROM may appear, see ::genie.mapper
+    entries: Iterable[int] = None
+        CPU addresses to start from, in any bank mapped there. Default is
+        the addresses in the interrupt vectors, of each bank with them.
+
+    Returns: bytearray
+    A code map as of ::trace, for each byte of PRG
+    """
+    dmv = memoryview(prg)
+    size = len(dmv)
+    flags = bytearray(size)
+    work = []
+
+    def goto(pc, at, target):
+        # To TARGET from PC, at ROM offset AT
+        if target < 0x8000:
+            return
+        if target // PAGE_SIZE == pc // PAGE_SIZE:
+            work.append((target, at + target - pc))
+        else:
+            work.extend((target, L) for L in banks.offsets(target))
+
+    if entries is None:
+        for vector in (NMI_VECTOR, RESET_VECTOR, IRQ_VECTOR):
+            for at in banks.offsets(vector):
+                if at + 1 < size:
+                    goto(vector, at, dmv[at] | dmv[at + 1] << 8)
+    else:
+        work.extend((E, L) for E in entries if 0x8000 <= E <= 0xFFFF
+            for L in banks.offsets(E))
+
+    lengths, modes = (_op_length, _op_mode) if table is _op_table \
+        else _tables(table)
+    stops = {Opcodes.RTS.value.opcode, Opcodes.RTI.value.opcode,
+        Opcodes.BRK.value.opcode, Opcodes.JMP_I.value.opcode}
+    jump, call = Opcodes.JMP_A.value.opcode, Opcodes.JSR.value.opcode
+
+    while work:
+        pc, at = work.pop()
+        while True:
+            if at >= size or flags[at] & CODE_START:
+                break
+            opcode = dmv[at]
+            length = lengths[opcode]
+            if modes[opcode] == 0xFF or at + length > size:
+                break
+            if any(flags[at:at + length]):
+                break
+
+            flags[at] = CODE | CODE_START
+            flags[at + 1:at + length] = bytes((CODE,)) * (length - 1)
+            if opcode in stops:
+                break
+
+            if length == 3:
+                operand = dmv[at + 1] | dmv[at + 2] << 8
+            elif length == 2:
+                operand = dmv[at + 1]
+            target = pc + length
+            if opcode == jump:
+                target = operand
+            elif opcode == call:
+                goto(pc, at, operand)
+            elif modes[opcode] == _relative:
+                goto(pc, at,
+                    (target + operand - (operand & 0x80) * 2) & 0xFFFF)
+            if target > 0xFFFF:
+                break
+            if target // PAGE_SIZE != pc // PAGE_SIZE:
+                goto(pc, at, target)
+                break
+            pc, at = target, at + target - pc
+
+    return flags
+
 def decode(data: bytes, *, pc=None, table: Dict[int, Opcode]=_op_table):
     """
     Given 6502 compiled code and a staring PC, returns a generator of a sequence
@@ -300,23 +604,11 @@ def decode(data: bytes, *, pc=None, table: Dict[int, Opcode]=_op_table):
     position, (2) the bytes to be interepreted with the opcode (including
     the opcode itself), and (3) the current PC location.
     """
-    dmv = memoryview(data)
     if pc is None:
         # NOTE: 6502 is little-endian
-        pc = data[0xFFFD] << 8 + data[0xFFFC]
-
-    while True:
-        try:
-            bc = table[dmv[pc]]
-            lbc = len(bc)
-            yield bc, dmv[pc:pc+lbc], pc
-            pc += lbc
-        except KeyError:
-            # NOT a valid bytecode, just yield the one byte
-            yield None, dmv[pc], pc
-            pc += 1
-        except IndexError:
-            break
+        pc = (data[0xFFFD] << 8) + data[0xFFFC]
+
+    yield from disassemble(data, pc, table=table)
 
 def decompile(data: bytes, *, pc: int=None):
     """
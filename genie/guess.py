@@ -0,0 +1,251 @@
+"""
+The functions working on ROM files: improving codes and searching for
+values. Loaded on first use by the package, see ::genie.__getattr__.
+"""
+import re
+
+from . import addr_data_to_code, code_to_data_addr
+from .decompile import Opcodes as Ops, disassemble, trace, trace_banks, \
+    CODE_START, _op_length
+from .index import load_index
+from .metrics import active, staged
+from .patterns import Pattern, PatternSet
+from .rom import open_rom
+from .xref import XRef, DECREMENT, INCREMENT
+
+# Bound in the package when first used, see ::genie._load
+__all__ = [
+    'guess_safer_code', 'guess_based_on_char', 'iter_guesses_based_on_char',
+    'Ops', 'disassemble', 'trace', 'CODE_START', 'load_index', 'Pattern',
+    'PatternSet', 'open_rom', 'XRef', 'DECREMENT', 'INCREMENT',
+]
+
+
+@staged('improve')
+def guess_safer_code(code, rom_path):
+    rom = open_rom(rom_path)
+
+    addr, code, _ = code_to_data_addr(code)
+    # Compare with the byte at the address in every bank which the mapper
+    # might switch in there (see ::BankMap)
+    offsets = rom.banks.offsets(addr)
+    codes = {addr_data_to_code(addr, code, rom.prg[O]) for O in offsets}
+
+    metrics = active()
+    if metrics is not None:
+        metrics.count('improve.candidates', len(offsets))
+        metrics.count('improve.codes', len(codes))
+    return codes
+
+def guess_based_on_char(char, rom_path, write=200, harder=False, short=False,
+        check_dec=False, use_index=False, code_only=False, workers=None):
+    return set(iter_guesses_based_on_char(char, rom_path, write, harder,
+        short, check_dec, use_index, code_only, workers))
+
+def iter_guesses_based_on_char(char, rom_path, write=200, harder=False,
+        short=False, check_dec=False, use_index=False, code_only=False,
+        workers=None, limit=None, ranked=False):
+    """
+    Like ::guess_based_on_char, but yields each code once, as soon as it is
+    found, and stops after LIMIT codes.
+
+    Parameters:
+    ranked: bool = False
+        Yield the most relevant codes first (see ::_relevance) rather than
+        in order of location in the ROM. All the matches are found before
+        the first code is yielded, but that is cheap next to the scan when
+        the index is used.
+    """
+    guesses = _iter_guesses(char, rom_path, write, harder, short, check_dec,
+        use_index, code_only, workers, limit, ranked)
+    metrics = active()
+    if metrics is not None:
+        # Only the work of this function, the stages within are apart
+        guesses = metrics.timed('search', guesses, 'codes')
+    yield from guesses
+
+def _iter_guesses(char, rom_path, write, harder, short, check_dec,
+        use_index, code_only, workers, limit, ranked):
+    metrics = active()
+    rom = open_rom(rom_path)
+    value = ord(char)
+    if use_index:
+        # Query the prebuilt, on-disk index of all values instead of scanning
+        matches = _open_index(rom_path).lookup(value)
+        if metrics is not None:
+            metrics.count('index_hits', len(matches))
+        if code_only:
+            code_map, offsets = _code_map(rom_path), _assign_patterns()
+            count = len(matches)
+            matches = [
+                (id, location) for id, location in matches
+                if code_map[location - offsets[id].offset] & CODE_START
+            ]
+            if metrics is not None:
+                metrics.count('filtered.code_only', count - len(matches))
+    else:
+        matches = (
+            (match.id, match.location) for match in
+            _scan_prg(rom_path, _assign_patterns(value), code_only, workers)
+        )
+
+    if check_dec or ranked:
+        xref = _open_xref(rom_path, workers)
+    if check_dec:
+        # Only where the stored-to memory is ever decremented
+        matches = _decremented(matches, xref, rom.prg, metrics)
+        if metrics is not None:
+            matches = metrics.timed('check_dec', matches)
+    if ranked:
+        if metrics is not None:
+            metrics.start('rank')
+        matches = sorted(matches,
+            key=lambda M: -_relevance(xref, rom.prg, M[1]))
+        if metrics is not None:
+            metrics.stop()
+
+    # The harder idioms are sought in the same pass, but only used if asked
+    # for or if the others turn up nothing
+    seen, harder_codes = set(), []
+    addresses = rom.banks.cpu_addresses
+    for id, location in matches:
+        # A code for each window the bank may be switched into
+        for addr in addresses(location):
+            code = addr_data_to_code(addr, write,
+                value if not short else False)
+            if code in seen:
+                if metrics is not None:
+                    metrics.count('filtered.duplicate')
+                continue
+            if id in _harder_assign and not harder:
+                harder_codes.append(code)
+                continue
+            seen.add(code)
+            yield code
+            if limit is not None and len(seen) >= limit:
+                return
+
+    if metrics is not None:
+        metrics.count('filtered.harder', len(harder_codes) if seen else 0)
+    if not seen:
+        if metrics is not None and harder_codes:
+            metrics.count('harder_retry')
+        for code in harder_codes:
+            if code not in seen:
+                seen.add(code)
+                yield code
+                if limit is not None and len(seen) >= limit:
+                    return
+
+def _decremented(matches, xref, buffer, metrics=None):
+    # The MATCHES storing to memory which is ever decremented
+    for id, location in matches:
+        if xref.accessed(_store_target(buffer, location + 1), DECREMENT):
+            yield id, location
+        elif metrics is not None:
+            metrics.count('filtered.check_dec')
+
+def _relevance(xref, buffer, location):
+    # Score of the immediate load at LOCATION: stores to memory which is
+    # also counted up or down (eg. lives, health) score higher, more so
+    # where that happens in the same bank as the store.
+    target = _store_target(buffer, location + 1)
+    score = 0
+    for ref in xref[target]:
+        if ref.access & (DECREMENT | INCREMENT):
+            if ref.location // 0x4000 == location // 0x4000:
+                return 2
+            score = 1
+    return score
+
+def _assign_patterns(value=None):
+    """
+    Patterns of an immediate load of VALUE (any value if None) followed by a
+    store to memory. See ::guess_based_on_char
+    """
+    imm = lambda op: op if value is None else op(value)
+    return {
+        'LDA/STA_A': Pattern(imm(Ops.LDA), Ops.STA_A, offset=1),
+        'LDA/STA_Z': Pattern(imm(Ops.LDA), Ops.STA_Z, offset=1),
+        #'LDX/STX_Z': Pattern(imm(Ops.LDX), Ops.STX_Z, offset=1),
+        #'LDY/STY_Z': Pattern(imm(Ops.LDY), Ops.STY_Z, offset=1),
+        'LDY/STY_A': Pattern(imm(Ops.LDY), Ops.STY_A, offset=1),
+        'LDX/STX_A': Pattern(imm(Ops.LDX), Ops.STX_A, offset=1),
+    }
+
+_harder_assign = {'LDY/STY_A', 'LDX/STX_A'}
+
+def _open_index(rom_path):
+    rom = open_rom(rom_path)
+    return rom.memo('index',
+        lambda: load_index(rom.digest, _assign_patterns(), rom.prg))
+
+def _open_xref(rom_path, workers=None):
+    rom = open_rom(rom_path)
+    return rom.memo('xref',
+        lambda: XRef.build(_disassemble_rom(rom_path, workers)))
+
+def _disassemble_rom(rom_path, workers=None):
+    # Linear disassembly of the whole PRG ROM, kept with the ROM. Split over
+    # WORKERS processes if given.
+    rom = open_rom(rom_path)
+    def build():
+        if workers is None:
+            return disassemble(rom.prg)
+        from .parallel import disassemble_parallel
+        return disassemble_parallel(rom.prg, workers)
+    return rom.memo('disassembly', build)
+
+def _store_target(buffer, location):
+    # Memory address of the store instruction at LOCATION
+    if _op_length[buffer[location]] == 3:
+        return buffer[location + 1] | buffer[location + 2] << 8
+    return buffer[location + 1]
+
+def _scan_prg(rom_path, patterns, code_only=False, workers=None):
+    # Scans the PRG ROM once for all of PATTERNS, a dict of {id: Pattern},
+    # and yields the ::Match-es. If CODE_ONLY, only the matches starting at a
+    # reachable instruction (see ::_code_map). The whole PRG ROM is split
+    # over WORKERS processes if given.
+    matches = _scan_prg_matches(rom_path, patterns, code_only, workers)
+    metrics = active()
+    if metrics is not None:
+        matches = metrics.timed('scan', matches, 'pattern_hits')
+    return matches
+
+def _scan_prg_matches(rom_path, patterns, code_only, workers):
+    rom = open_rom(rom_path)
+    metrics = active()
+    if not code_only and workers is not None:
+        from .parallel import scan_parallel
+        if metrics is not None:
+            metrics.count('bytes_scanned', len(rom.prg))
+        yield from scan_parallel(rom.prg, patterns, workers)
+        return
+    patterns = PatternSet(patterns)
+    if not code_only:
+        if metrics is not None:
+            metrics.count('bytes_scanned', len(rom.prg))
+        yield from patterns.scan(rom.prg)
+        return
+
+    # Skip over the data entirely
+    code_map = _code_map(rom_path)
+    for run in re.finditer(rb'[^\x00]+', code_map):
+        end = min(run.end() + patterns.length - 1, len(rom.prg))
+        if metrics is not None:
+            metrics.count('bytes_scanned', end - run.start())
+        for match in patterns.scan(rom.prg, run.start(), end):
+            if code_map[match.start] & CODE_START:
+                yield match
+            elif metrics is not None:
+                metrics.count('filtered.code_only')
+
+def _code_map(rom_path):
+    """
+    Code map (see ::decompile.trace_banks) of the PRG ROM, traced from the
+    interrupt vectors into every bank its mapper may switch in, and kept
+    with the ROM.
+    """
+    rom = open_rom(rom_path)
+    return rom.memo('code_map', lambda: trace_banks(rom.prg, rom.banks))
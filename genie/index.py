@@ -0,0 +1,182 @@
+import hashlib
+import json
+import os
+import struct
+import tempfile
+from array import array
+
+from .metrics import active
+from .patterns import PatternSet
+
+
+class IdiomIndex:
+    """
+    Inverted index of pattern matches in a ROM, keyed by the value of the
+    byte at each pattern's offset (eg. the operand of an immediate load).
+    Looking up the matches for a value costs O(results).
+
+    The index is kept as three flat arrays: the pattern number and the buffer
+    location of each match, sorted by value, and the start of each value's
+    run of matches.
+    """
+    MAGIC = b'GGIX'
+    VERSION = 2
+
+    def __init__(self, ids, starts, kinds, locations):
+        self.ids = list(ids)
+        self.starts = starts
+        self.kinds = kinds
+        self.locations = locations
+
+    @classmethod
+    def build(cls, patterns, buffer, start=0, end=None):
+        """
+        Scans BUFFER once for PATTERNS, a dict of {id: Pattern}, and indexes
+        every match by the value of its offset byte.
+        """
+        ids = list(patterns)
+        number = {id: i for i, id in enumerate(ids)}
+        runs = [[] for _ in range(256)]
+        for match in PatternSet(patterns).scan(buffer, start, end):
+            runs[buffer[match.location]].append(
+                (number[match.id], match.location))
+
+        starts, kinds, locations = array('L', [0]), array('B'), array('L')
+        for run in runs:
+            for kind, location in run:
+                kinds.append(kind)
+                locations.append(location)
+            starts.append(len(kinds))
+        return cls(ids, starts, kinds, locations)
+
+    def lookup(self, value):
+        """
+        Returns: List[Tuple[id, int]]
+        The (pattern id, buffer location) of each match for VALUE, in buffer
+        order.
+        """
+        ids, kinds, locations = self.ids, self.kinds, self.locations
+        return [
+            (ids[kinds[i]], locations[i])
+            for i in range(self.starts[value], self.starts[value + 1])
+        ]
+
+    def tobytes(self):
+        # The pattern ids are kept as JSON, so only those which come back
+        # the same can be saved
+        if any(type(I) not in (str, int) for I in self.ids):
+            raise TypeError('Only indexes with str or int ids can be saved')
+        names = json.dumps(self.ids).encode()
+        return b''.join((
+            struct.pack('<4sHHI', self.MAGIC, self.VERSION, len(names),
+                len(self.kinds)),
+            names,
+            _little(self.starts, 'I'),
+            self.kinds.tobytes(),
+            _little(self.locations, 'I'),
+        ))
+
+    @classmethod
+    def frombytes(cls, data):
+        magic, version, lnames, count = struct.unpack_from('<4sHHI', data)
+        if magic != cls.MAGIC or version != cls.VERSION:
+            raise ValueError('Not a (current) index file')
+        offset = struct.calcsize('<4sHHI')
+        ids = json.loads(bytes(data[offset:offset + lnames]))
+        offset += lnames
+        starts = array('L', struct.unpack_from(f'<{257}I', data, offset))
+        offset += 257 * 4
+        kinds = array('B', data[offset:offset + count])
+        offset += count
+        locations = array('L', struct.unpack_from(f'<{count}I', data, offset))
+        return cls(ids, starts, kinds, locations)
+
+
+def _little(values, format):
+    return struct.pack(f'<{len(values)}{format}', *values)
+
+
+# The most indexes kept in the cache, the least recently used are removed
+CACHE_SIZE = 64
+
+def cache_dir():
+    """
+    Directory where indexes are kept: $GENIE_CACHE, or `genie` under
+    $XDG_CACHE_HOME (default ~/.cache). Only the ::CACHE_SIZE most recently
+    used are kept, and the directory may be removed at any time to clear it.
+    """
+    if 'GENIE_CACHE' in os.environ:
+        return os.environ['GENIE_CACHE']
+    base = os.environ.get('XDG_CACHE_HOME') \
+        or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'genie')
+
+
+def load_index(digest, patterns, buffer, start=0, end=None):
+    """
+    Fetches the index of PATTERNS for the ROM with contents hash DIGEST from
+    the on-disk cache, building it from BUFFER (usually the PRG ROM) and
+    storing it if necessary. The cache is keyed by the ROM contents and the
+    patterns, so a changed file gets a fresh index.
+    """
+    key = hashlib.sha1(digest.encode())
+    for P in patterns.values():
+        key.update(P.regex)
+        key.update(struct.pack('<i', P.offset))
+    key.update(struct.pack('<ii', start, -1 if end is None else end))
+    path = os.path.join(cache_dir(), key.hexdigest() + '.idx')
+
+    metrics = active()
+    try:
+        with open(path, 'rb') as file:
+            index = IdiomIndex.frombytes(file.read())
+    except (OSError, ValueError, struct.error):
+        pass
+    else:
+        if metrics is not None:
+            metrics.hit('index_cache', True)
+        try:
+            # Recently used, see ::_evict
+            os.utime(path)
+        except OSError:
+            pass
+        return index
+    if metrics is not None:
+        metrics.hit('index_cache', False)
+
+    index = IdiomIndex.build(patterns, buffer, start, end)
+    try:
+        data = index.tobytes()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # A file of its own, as other threads may be saving the same index
+        fd, temp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+            os.replace(temp, path)
+        except BaseException:
+            os.unlink(temp)
+            raise
+        _evict(os.path.dirname(path))
+    except (OSError, TypeError):
+        # The cache is a nicety, the index is still good
+        pass
+    return index
+
+def _evict(directory, keep=None):
+    # Removes all but the KEEP (default ::CACHE_SIZE) most recently used
+    # indexes in DIRECTORY
+    keep = CACHE_SIZE if keep is None else keep
+    entries = []
+    for entry in os.scandir(directory):
+        if entry.name.endswith('.idx'):
+            try:
+                entries.append((entry.stat().st_mtime, entry.path))
+            except OSError:
+                pass
+    entries.sort(reverse=True)
+    for _, path in entries[keep:]:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
@@ -0,0 +1,113 @@
+"""
+Runs searches and improvements over a whole library of ROMs in parallel.
+ROMs are read from directories or straight out of zip archives, and one
+record is produced per ROM and query as soon as it's done.
+"""
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import NamedTuple
+
+from . import guess_based_on_char, guess_safer_code
+from .rom import Rom, open_rom
+
+ROM_EXTENSIONS = ('.nes',)
+
+
+class Query(NamedTuple):
+    kind:   str         # 'search' or 'improve'
+    arg:    object      # value sought (int) or code to improve (str)
+    write:  int = 200   # replacement value for searches
+
+
+class Source(NamedTuple):
+    path:   str         # file or zip archive
+    member: str = None  # member of the zip archive
+
+    @property
+    def name(self):
+        return f'{self.path}:{self.member}' if self.member else self.path
+
+    def open(self):
+        if self.member is None:
+            return open_rom(self.path)
+        with zipfile.ZipFile(self.path) as archive:
+            return Rom(archive.read(self.member), self.name)
+
+
+def iter_sources(paths):
+    """
+    Finds the ROMs in PATHS: ROM files, directories (recursively) and zip
+    archives of ROMs.
+
+    Returns: Generator[Source]
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                yield from iter_sources(
+                    os.path.join(root, F) for F in sorted(files)
+                    if _is_rom(F) or F.lower().endswith('.zip'))
+        elif path.lower().endswith('.zip'):
+            try:
+                with zipfile.ZipFile(path) as archive:
+                    members = [M for M in archive.namelist() if _is_rom(M)]
+            except (OSError, zipfile.BadZipFile):
+                # Reported as a bad ROM when processed
+                yield Source(path)
+                continue
+            for member in members:
+                yield Source(path, member)
+        else:
+            yield Source(path)
+
+def _is_rom(name):
+    return name.lower().endswith(ROM_EXTENSIONS)
+
+
+def process(source, queries):
+    """
+    Runs all QUERIES against the ROM of SOURCE.
+
+    Returns: List[dict]
+    One record per query, or a single record with an `error` if the ROM
+    can't be read.
+    """
+    try:
+        rom = source.open()
+    except Exception as e:
+        return [{'rom': source.name, 'error': str(e)}]
+
+    records = []
+    for query in queries:
+        record = {'rom': source.name, 'sha1': rom.digest,
+            'query': query.kind, 'arg': query.arg}
+        try:
+            if query.kind == 'search':
+                codes = guess_based_on_char(bytes((query.arg,)), rom,
+                    write=query.write)
+            elif query.kind == 'improve':
+                codes = guess_safer_code(query.arg, rom)
+            else:
+                raise ValueError(f'Unsupported query: {query.kind}')
+            record['codes'] = sorted(codes)
+        except Exception as e:
+            record['error'] = str(e)
+        records.append(record)
+    return records
+
+
+def scan_library(paths, queries, workers=None):
+    """
+    Runs QUERIES against every ROM in PATHS (see ::iter_sources), spread
+    over WORKERS processes (default is one per CPU).
+
+    Returns: Generator[dict]
+    The records (see ::process), in the order they finish
+    """
+    queries = list(queries)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = [pool.submit(process, S, queries) for S in iter_sources(paths)]
+        for future in as_completed(pending):
+            yield from future.result()
@@ -0,0 +1,140 @@
+"""
+Where the PRG ROM appears in the CPU address space, by mapper. A Game Genie
+code patches a CPU address in $8000-$FFFF, which reads whichever bank of
+the PRG ROM the mapper has switched in there. Knowing which banks can be
+switched into each window, the ROM offsets a code may patch (and so its
+valid compare values), and the CPU addresses at which a byte of the ROM
+may be read, are both a table lookup.
+
+Mappers with modes are modelled at their usual setting, eg. MMC1 with the
+last 16k bank fixed at $C000.
+"""
+# The tables are kept at the finest granularity of any mapper: 8k pages,
+# four of them at $8000, $A000, $C000 and $E000
+PAGE_SIZE = 0x2000
+PAGES = 4
+
+# The windows of each layout, as (CPU address, size, bank). The bank is
+# None if any bank may be switched in, otherwise the bank fixed there,
+# counted from the end if negative. Bank numbers wrap around, so a ROM
+# smaller than a window is mirrored in it.
+FIXED = [(0x8000, 0x8000, 0)]
+SWITCH_32K = [(0x8000, 0x8000, None)]
+SWITCH_16K = [(0x8000, 0x4000, None), (0xC000, 0x4000, -1)]
+SWITCH_16K_HIGH = [(0x8000, 0x4000, 0), (0xC000, 0x4000, None)]
+SWITCH_8K = [(0x8000, 0x2000, None), (0xA000, 0x2000, None),
+    (0xC000, 0x2000, None), (0xE000, 0x2000, -1)]
+MMC2 = [(0x8000, 0x2000, None), (0xA000, 0x2000, -3),
+    (0xC000, 0x2000, -2), (0xE000, 0x2000, -1)]
+
+LAYOUTS = {
+    0:      FIXED,              # NROM
+    1:      SWITCH_16K,         # MMC1
+    2:      SWITCH_16K,         # UxROM
+    3:      FIXED,              # CNROM
+    4:      SWITCH_8K,          # MMC3
+    5:      SWITCH_8K,          # MMC5
+    7:      SWITCH_32K,         # AxROM
+    9:      MMC2,               # MMC2
+    10:     SWITCH_16K,         # MMC4
+    11:     SWITCH_32K,         # Color Dreams
+    13:     FIXED,              # CPROM
+    16:     SWITCH_16K,         # Bandai FCG
+    19:     SWITCH_8K,          # Namco 163
+    21:     SWITCH_8K,          # VRC4
+    22:     SWITCH_8K,          # VRC2
+    23:     SWITCH_8K,          # VRC2/VRC4
+    24:     SWITCH_8K,          # VRC6
+    25:     SWITCH_8K,          # VRC4
+    26:     SWITCH_8K,          # VRC6
+    34:     SWITCH_32K,         # BNROM
+    66:     SWITCH_32K,         # GxROM
+    69:     SWITCH_8K,          # Sunsoft FME-7
+    71:     SWITCH_16K,         # Camerica
+    85:     SWITCH_8K,          # VRC7
+    87:     FIXED,              # Jaleco
+    118:    SWITCH_8K,          # TxSROM
+    119:    SWITCH_8K,          # TQROM
+    180:    SWITCH_16K_HIGH,    # UNROM, fixed low
+    185:    FIXED,              # CNROM with protection
+}
+
+
+class BankMap:
+    """
+    The banks of a PRG ROM of SIZE bytes (per the header) which MAPPER may
+    switch into each page of $8000-$FFFF, of which only the first AVAILABLE
+    bytes are in the file. Unknown mappers (and fixed ones with too much
+    PRG ROM for 32k) are taken to switch 16k banks at $8000 with the last
+    one fixed at $C000, as most do, or as NROM for up to 32k.
+
+    Attributes:
+    pages: Tuple[Tuple[int]]
+        The ROM offsets of the 8k banks which may be read at each page
+    addresses: List[Tuple[int]]
+        The CPU addresses of the pages at which each 8k bank of the ROM
+        (by offset // 8k) may be read
+    """
+    def __init__(self, mapper, size, available=None):
+        self.mapper = mapper
+        self.size = size
+        self.available = size if available is None else available
+        layout = LAYOUTS.get(mapper)
+        if layout is None or layout is FIXED and size > 0x8000:
+            # Unknown, or the header is wrong
+            layout = FIXED if size <= 0x8000 else SWITCH_16K
+
+        count = max(-(-size // PAGE_SIZE), 1)
+        pages = [set() for _ in range(PAGES)]
+        for start, window, bank in layout:
+            banks = max(-(-size // window), 1)
+            first = (start - 0x8000) // PAGE_SIZE
+            for B in range(banks) if bank is None else (bank % banks,):
+                for page in range(window // PAGE_SIZE):
+                    pages[first + page].add(
+                        (B * window // PAGE_SIZE + page) % count)
+
+        self.pages = tuple(
+            tuple(P * PAGE_SIZE for P in sorted(banks)
+                if P * PAGE_SIZE < self.available)
+            for banks in pages
+        )
+        addresses = [[] for _ in range(count)]
+        for page, banks in enumerate(self.pages):
+            for offset in banks:
+                addresses[offset // PAGE_SIZE].append(
+                    0x8000 + page * PAGE_SIZE)
+        self.addresses = [tuple(A) for A in addresses]
+
+    def offsets(self, addr):
+        """
+        Returns: List[int]
+        The ROM offsets which may be read at CPU ADDR ($8000-$FFFF)
+        """
+        at = addr % PAGE_SIZE
+        return [
+            P + at for P in self.pages[(addr - 0x8000) // PAGE_SIZE]
+            if P + at < self.available
+        ]
+
+    def cpu_addresses(self, location):
+        """
+        Returns: List[int]
+        The CPU addresses at which the byte at ROM offset LOCATION may be
+        read
+        """
+        at = location % PAGE_SIZE
+        return [A + at for A in self.addresses[location // PAGE_SIZE]]
+
+    def initial(self, prg):
+        """
+        Returns: bytes
+        The 32k of $8000-$FFFF as at power on, with the first of the banks
+        which may be switched in at each page
+        """
+        result = bytearray(PAGES * PAGE_SIZE)
+        for page, banks in enumerate(self.pages):
+            if banks:
+                bank = bytes(prg[banks[0]:banks[0] + PAGE_SIZE])
+                result[page * PAGE_SIZE:page * PAGE_SIZE + len(bank)] = bank
+        return bytes(result)
@@ -0,0 +1,142 @@
+"""
+Timings and counters of the stages of searching and improving codes, to
+see where the time goes. Nothing is recorded unless collecting (see
+::collect), and the instrumented functions then only test ::current.
+
+    >>> with collect() as metrics:
+    ...     guess_based_on_char(b'\\x03', 'game.nes', check_dec=True)
+    >>> metrics.to_dict()
+    {'stages': {'scan': {'seconds': 0.012, 'calls': 4}, ...},
+     'counters': {'bytes_scanned': 262144, 'pattern_hits': 96, ...},
+     'hit_rates': {'rom_cache': 0.5, ...}}
+
+Stage times are exclusive: the time of a stage run within another (eg. the
+scan feeding the `check_dec` filter) counts only toward the inner one.
+Collection is process-wide, not per thread.
+"""
+import functools
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# The ::Metrics being collected into, if any. See ::active.
+current = None
+
+
+class Metrics:
+    def __init__(self):
+        self.seconds = Counter()
+        self.calls = Counter()
+        self.counters = Counter()
+        # [name, start, time of inner stages] of the stages running
+        self._stack = []
+        self.started = time.perf_counter()
+        self.total = None
+
+    def start(self, name):
+        self._stack.append([name, time.perf_counter(), 0.0])
+
+    def stop(self):
+        name, start, inner = self._stack.pop()
+        elapsed = time.perf_counter() - start
+        self.seconds[name] += elapsed - inner
+        self.calls[name] += 1
+        if self._stack:
+            self._stack[-1][2] += elapsed
+
+    @contextmanager
+    def stage(self, name):
+        self.start(name)
+        try:
+            yield
+        finally:
+            self.stop()
+
+    def timed(self, name, iterable, counter=None):
+        """
+        Yields from ITERABLE, timing the work of each item as stage NAME,
+        and counting the items as COUNTER if given
+        """
+        iterator = iter(iterable)
+        while True:
+            self.start(name)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.stop()
+            if counter is not None:
+                self.counters[counter] += 1
+            yield item
+
+    def count(self, name, value=1):
+        self.counters[name] += value
+
+    def hit(self, cache, hit):
+        self.counters[f'{cache}.hits' if hit else f'{cache}.misses'] += 1
+
+    def to_dict(self):
+        rates = {}
+        for name in self.counters:
+            if name.endswith('.hits') or name.endswith('.misses'):
+                cache = name.rsplit('.', 1)[0]
+                hits = self.counters[f'{cache}.hits']
+                rates[cache] = round(hits
+                    / (hits + self.counters[f'{cache}.misses']), 4)
+        total = self.total if self.total is not None \
+            else time.perf_counter() - self.started
+        return {
+            'seconds': round(total, 6),
+            'stages': {
+                N: {'seconds': round(S, 6), 'calls': self.calls[N]}
+                for N, S in sorted(self.seconds.items(), key=lambda I: -I[1])
+            },
+            'counters': dict(sorted(self.counters.items())),
+            'hit_rates': dict(sorted(rates.items())),
+        }
+
+    def dump(self, stream):
+        import json
+        json.dump(self.to_dict(), stream, indent=2)
+        stream.write('\n')
+
+
+@contextmanager
+def collect():
+    """
+    Collects the metrics of everything run within, into the ::Metrics
+    yielded. May be nested; the inner collection is then kept apart.
+    """
+    global current
+    outer, current = current, Metrics()
+    metrics = current
+    try:
+        yield metrics
+    finally:
+        metrics.total = time.perf_counter() - metrics.started
+        current = outer
+
+def active():
+    """
+    Returns: Metrics
+    The metrics being collected into, or None. For the modules of the
+    package, which can't `from . import metrics` while it is being loaded
+    (see ::genie.__getattr__).
+    """
+    return current
+
+def staged(name):
+    """
+    Decorator timing each call of the function as stage NAME, when
+    collecting
+    """
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if current is None:
+                return function(*args, **kwargs)
+            with current.stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
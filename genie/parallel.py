@@ -0,0 +1,177 @@
+"""
+Splits the work on one large ROM into bank-aligned chunks which are
+processed in worker processes. The ROM is placed in shared memory once,
+rather than copied to each worker, and the results are merged to be
+identical to (and in the same order as) those of the serial functions.
+"""
+from array import array
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+from .decompile import Disassembly, disassemble, _op_length, _op_table
+from .patterns import Match, PatternSet
+
+BANK_SIZE = 16384
+
+
+class SharedBuffer:
+    """
+    A copy of DATA in shared memory for the duration of a `with` block
+    """
+    def __init__(self, data):
+        self.size = len(data)
+        self.shm = SharedMemory(create=True, size=max(1, self.size))
+        self.shm.buf[:self.size] = data
+        self.name = self.shm.name
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shm.close()
+        self.shm.unlink()
+
+
+def _attach(name):
+    try:
+        return SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13. The workers share the resource tracker of the
+        # parent, which unlinks the segment.
+        return SharedMemory(name=name)
+
+
+def chunks(size, workers, align=BANK_SIZE):
+    """
+    Splits SIZE bytes into about WORKERS chunks whose boundaries are
+    multiples of ALIGN.
+
+    Returns: List[Tuple[int, int]]
+    The (start, end) of each chunk
+    """
+    banks = -(-size // align)
+    per_chunk = max(1, -(-banks // max(1, workers)))
+    return [
+        (start, min(size, start + per_chunk * align))
+        for start in range(0, size, per_chunk * align)
+    ]
+
+
+def _scan_chunk(name, size, patterns, start, end):
+    shm = _attach(name)
+    try:
+        buffer = shm.buf[:size]
+        try:
+            patterns = PatternSet(patterns)
+            # Matches starting in the chunk may run into the next one
+            stop = min(size, end + patterns.length - 1)
+            return [
+                tuple(match)
+                for match in patterns.scan(buffer, start, stop)
+                if match.start < end
+            ]
+        finally:
+            buffer.release()
+    finally:
+        shm.close()
+
+
+def scan_parallel(data, patterns, workers=None, executor=None):
+    """
+    Parallel ::PatternSet.scan of DATA for PATTERNS, a dict of {id: Pattern}.
+
+    Returns: List[Match]
+    The same matches, in the same order, as a serial scan
+    """
+    with _Pool(executor, workers) as (pool, count), SharedBuffer(data) as shared:
+        futures = [
+            pool.submit(_scan_chunk, shared.name, shared.size, patterns,
+                start, end)
+            for start, end in chunks(shared.size, count)
+        ]
+        return [Match(*M) for future in futures for M in future.result()]
+
+
+def _disassemble_chunk(name, size, start, end):
+    shm = _attach(name)
+    try:
+        buffer = shm.buf[:size]
+        try:
+            result = disassemble(buffer, start, end)
+            # Drops the view of the shared memory held by the result
+            arrays = result.pc, result.opcode, result.operand
+            del result
+            return arrays
+        finally:
+            buffer.release()
+    finally:
+        shm.close()
+
+
+def disassemble_parallel(data, workers=None, executor=None):
+    """
+    Parallel ::disassemble of the whole of DATA. Each chunk is swept from
+    its start. Where the instruction before a chunk actually runs into it,
+    the sweep is redone serially from there until it falls in step with the
+    chunk's sweep, which is usually within a few instructions.
+
+    Returns: Disassembly
+    The same as the serial disassembly
+    """
+    data = memoryview(data)
+    with _Pool(executor, workers) as (pool, count), SharedBuffer(data) as shared:
+        parts = chunks(shared.size, count)
+        futures = [
+            pool.submit(_disassemble_chunk, shared.name, shared.size,
+                start, end)
+            for start, end in parts
+        ]
+
+        pcs, opcodes, operands = array('L'), bytearray(), array('L')
+        pc = 0
+        for (start, end), future in zip(parts, futures):
+            cpcs, copcodes, coperands = future.result()
+            skip = 0
+            while pc > start:
+                # Out of step: redo the sweep until an instruction of the
+                # chunk's sweep is reached
+                skip = bisect_left(cpcs, pc)
+                if skip < len(cpcs) and cpcs[skip] == pc:
+                    break
+                if pc >= end:
+                    skip = len(cpcs)
+                    break
+                step = disassemble(data, pc, pc + 1)
+                pcs.extend(step.pc)
+                opcodes.extend(step.opcode)
+                operands.extend(step.operand)
+                pc = step.pc[-1] + _op_length[step.opcode[-1]]
+
+            pcs.extend(cpcs[skip:])
+            opcodes.extend(copcodes[skip:])
+            operands.extend(coperands[skip:])
+            if len(pcs):
+                pc = pcs[-1] + _op_length[opcodes[-1]]
+
+    return Disassembly(data, _op_table, pcs, bytes(opcodes), operands)
+
+
+class _Pool:
+    # Uses EXECUTOR if given, otherwise a process pool of WORKERS for the
+    # duration of the `with` block. Yields the pool and its number of
+    # workers.
+    def __init__(self, executor, workers):
+        self.executor = executor
+        self.workers = workers
+
+    def __enter__(self):
+        if self.executor is None:
+            self.owned = ProcessPoolExecutor(max_workers=self.workers)
+            return self.owned, self.owned._max_workers
+        self.owned = None
+        return self.executor, self.workers or self.executor._max_workers
+
+    def __exit__(self, *exc):
+        if self.owned is not None:
+            self.owned.shutdown()
@@ -0,0 +1,131 @@
+import re
+from typing import NamedTuple
+
+from .decompile import Opcode, OpcodeInstance, OpcodeSequence, Opcodes
+
+
+class Match(NamedTuple):
+    id:         object
+    location:   int     # buffer offset of the pattern's `offset` byte
+    start:      int     # buffer offset where the pattern starts
+
+
+class Pattern:
+    """
+    A sequence of instructions to be sought in compiled 6502 code. Each token
+    of the pattern can be
+
+        OpcodeInstance  the exact instruction, eg. `Opcodes.LDA(3)`
+        OpcodeSequence  the exact instructions, eg. `Opcodes.LDA(3) + ...`
+        Opcodes/Opcode  the instruction with any operand, eg. `Opcodes.STA_A`
+        bytes/list      the exact bytes
+        int             the exact byte
+        None            any one byte
+        tuple           any one of the tokens in the tuple
+
+    Parameters:
+    offset: int = 0
+        Offset of the byte of interest from the start of the pattern, which
+        is reported in ::Match.location
+    """
+    def __init__(self, *tokens, offset=0):
+        self.tokens = tokens
+        self.offset = offset
+        self.regex = b''.join(_token_regex(T) for T in tokens)
+        self.length = sum(_token_length(T) for T in tokens)
+        self.first = _first_bytes(tokens[0])
+        self.compiled = re.compile(self.regex, re.DOTALL)
+
+    def __repr__(self):
+        return f'Pattern({", ".join(map(repr, self.tokens))}, offset={self.offset})'
+
+
+class PatternSet:
+    """
+    Compiles many patterns, given as a dict of {id: Pattern}, into a single
+    regular expression so that a buffer is scanned just once for all of them.
+    """
+    def __init__(self, patterns):
+        self.patterns = dict(patterns)
+        # A zero-width lookahead finds (overlapping) positions where any of
+        # the patterns starts. Which patterns actually match there is then
+        # sorted out by the first byte.
+        self._finder = re.compile(b'(?=' + b'|'.join(
+            P.regex for P in self.patterns.values()) + b')', re.DOTALL)
+        self.length = max((P.length for P in self.patterns.values()),
+            default=0)
+        self._dispatch = [[] for _ in range(256)]
+        for id, P in self.patterns.items():
+            for byte in P.first:
+                self._dispatch[byte].append((id, P))
+
+    def scan(self, buffer, start=0, end=None):
+        """
+        Scans BUFFER between START and END for all the patterns of the set.
+
+        Returns: Generator[Match]
+        A generator of the matches, ordered by location in the buffer and
+        then by the order of the patterns in the set.
+        """
+        if end is None:
+            end = len(buffer)
+        dispatch = self._dispatch
+        for m in self._finder.finditer(buffer, start, end):
+            pos = m.start()
+            for id, P in dispatch[buffer[pos]]:
+                if P.compiled.match(buffer, pos, end):
+                    yield Match(id, pos + P.offset, pos)
+
+
+def _token_regex(token):
+    if isinstance(token, Opcodes):
+        token = token.value
+    if isinstance(token, Opcode):
+        return re.escape(bytes((token.opcode,))) \
+            + b'.' * token.address_type.addr_bytes
+    elif isinstance(token, (OpcodeInstance, OpcodeSequence)):
+        return re.escape(token.tobytes())
+    elif isinstance(token, (bytes, bytearray, list)):
+        return re.escape(bytes(token))
+    elif isinstance(token, int):
+        return re.escape(bytes((token,)))
+    elif token is None:
+        return b'.'
+    elif isinstance(token, tuple):
+        return b'(?:' + b'|'.join(_token_regex(T) for T in token) + b')'
+    raise TypeError(f'Unsupported pattern token: {token!r}')
+
+def _token_length(token):
+    # Longest possible length of the bytes matching TOKEN
+    if isinstance(token, Opcodes):
+        token = token.value
+    if isinstance(token, Opcode):
+        return len(token)
+    elif isinstance(token, (OpcodeInstance, OpcodeSequence)):
+        return len(token.tobytes())
+    elif isinstance(token, (bytes, bytearray, list)):
+        return len(token)
+    elif isinstance(token, int) or token is None:
+        return 1
+    elif isinstance(token, tuple):
+        return max(_token_length(T) for T in token)
+    raise TypeError(f'Unsupported pattern token: {token!r}')
+
+def _first_bytes(token):
+    if isinstance(token, Opcodes):
+        token = token.value
+    if isinstance(token, Opcode):
+        return {token.opcode}
+    elif isinstance(token, OpcodeInstance):
+        return {token.opcode.opcode}
+    elif isinstance(token, OpcodeSequence):
+        return {token.tobytes()[0]}
+    elif isinstance(token, (bytes, bytearray, list)):
+        return {token[0]}
+    elif isinstance(token, int):
+        return {token}
+    elif token is None:
+        return set(range(256))
+    elif isinstance(token, tuple):
+        return set().union(*(_first_bytes(T) for T in token))
+    raise TypeError(f'Unsupported pattern token: {token!r}')
@@ -0,0 +1,149 @@
+"""
+Ports codes from one revision of a game's ROM to another (eg. USA to
+Europe), where the code patched has moved. The code around each patched
+byte in the source ROM is looked up in an index of the target ROM, and the
+code is made again for the best match.
+
+Addresses of the ROM itself (jump and call targets, tables) tend to change
+between revisions when everything else is the same, so the operands which
+are such addresses are blanked in both ROMs before they are compared.
+"""
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from typing import NamedTuple
+
+from . import addr_data_to_code, code_to_data_addr
+from .decompile import disassemble, _op_length
+from .rom import open_rom
+
+# Bytes of the keys of the index, and the most places a key may be found in
+# the target ROM before it says too little to go on (eg. padding)
+KEY_SIZE = 8
+MAX_HITS = 64
+
+BANK_SIZE = 16384
+
+
+class Port(NamedTuple):
+    code:       str     # the code for the target ROM
+    location:   int     # PRG ROM offset of the patched byte in the target
+    score:      int     # number of bytes of context agreeing on LOCATION
+
+
+class ContextIndex:
+    """
+    A suffix array of the (normalized, see ::normalize) PRG ROM, to a depth
+    of ::KEY_SIZE bytes: the position of every run of that many bytes,
+    sorted by its contents. Finding a run costs O(log n).
+    """
+    def __init__(self, data):
+        self.data = data
+        keys = _keys(data)
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        self.keys = array('Q', (keys[i] for i in order))
+        self.positions = array('L', order)
+
+    def find(self, key):
+        """
+        Returns: array
+        The positions of KEY, an int as from ::_key, in the data
+        """
+        first = bisect_left(self.keys, key)
+        return self.positions[first:bisect_right(self.keys, key, first)]
+
+def _keys(data):
+    # The KEY_SIZE bytes at every position of DATA as an int (see ::_key),
+    # read as KEY_SIZE interleaved arrays of aligned words
+    count = max(len(data) - KEY_SIZE + 1, 0)
+    keys = array('Q', bytes(8 * count))
+    for shift in range(min(KEY_SIZE, count)):
+        words = (count - shift + KEY_SIZE - 1) // KEY_SIZE
+        keys[shift::KEY_SIZE] = array('Q',
+            data[shift:shift + words * KEY_SIZE])
+    return keys
+
+def _key(data, at):
+    return int.from_bytes(data[at:at + KEY_SIZE], sys.byteorder)
+
+
+def normalize(prg):
+    """
+    Returns: bytes
+    PRG with the operands which are addresses of the ROM ($8000 and up)
+    zeroed, going by a linear disassembly
+    """
+    result = bytearray(prg)
+    code = disassemble(prg)
+    for pc, opcode, operand in zip(code.pc, code.opcode, code.operand):
+        if operand >= 0x8000 and _op_length[opcode] == 3 \
+                and pc + 3 <= len(result):
+            result[pc + 1:pc + 3] = b'\0\0'
+    return bytes(result)
+
+def _normalized(rom):
+    return rom.memo('normalized', lambda: normalize(rom.prg))
+
+def _open_context_index(rom):
+    return rom.memo('context_index', lambda: ContextIndex(_normalized(rom)))
+
+
+def port_codes(codes, source_rom, target_rom, radius=24, min_score=4):
+    """
+    Ports CODES from SOURCE_ROM to TARGET_ROM. The target is indexed once
+    (and the index kept with the ROM) for all the codes.
+
+    Each ROM offset the code may patch in the source (see ::BankMap; those
+    with the compare value, for 8-letter codes) is tried. Every run of bytes within
+    RADIUS of the patched one, in the same bank, which is found in the
+    target votes for where the patched byte is there.
+
+    Returns: Dict[str, Port]
+    The ::Port of each code, with a fresh compare value, or None if no
+    place (which the mapper can switch in) got MIN_SCORE votes
+    """
+    source, target = open_rom(source_rom), open_rom(target_rom)
+    data = _normalized(source)
+    index = _open_context_index(target)
+
+    result = {}
+    for code in codes:
+        addr, value, compare = code_to_data_addr(code)
+        best = None
+        for location in source.banks.offsets(addr):
+            if compare is not None and source.prg[location] != compare:
+                continue
+            found = _locate(data, location, index, radius)
+            if found is not None and (best is None or found[1] > best[1]):
+                best = found
+
+        addresses = () if best is None \
+            else target.banks.cpu_addresses(best[0])
+        if not addresses or best[1] < min_score:
+            result[code] = None
+            continue
+        location, score = best
+        # The same window of the CPU address space as the original, if the
+        # bank may be switched in there
+        ported = min(addresses, key=lambda A: (A ^ addr) >> 13)
+        result[code] = Port(addr_data_to_code(ported, value,
+            target.prg[location]), location, score)
+    return result
+
+def _locate(data, location, index, radius):
+    # Best (location, votes) in the index for LOCATION in DATA
+    bank = location - location % BANK_SIZE
+    first = max(bank, location - radius)
+    last = min(bank + BANK_SIZE, len(data), location + radius + 1) \
+        - KEY_SIZE
+    votes = Counter()
+    for at in range(first, last + 1):
+        hits = index.find(_key(data, at))
+        if len(hits) <= MAX_HITS:
+            votes.update(P + location - at for P in hits)
+
+    size = len(index.data)
+    for place, count in votes.most_common():
+        if 0 <= place < size:
+            return place, count
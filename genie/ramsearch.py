@@ -0,0 +1,180 @@
+"""
+Cheat search over snapshots of the NES's 2k of RAM: the addresses whose
+value behaved in some way over the snapshots (eg. went down by one each time
+a life was lost) are narrowed down in a few vectorized comparisons, and then
+the instructions in the ROM storing to or decrementing them are turned into
+codes. Requires NumPy.
+"""
+from typing import NamedTuple
+
+import numpy as np
+
+from . import addr_data_to_code
+from .decompile import _mnemonics, _op_length, _op_mnemonic
+from .guess import _open_xref
+from .rom import open_rom
+from .xref import DECREMENT, WRITE
+
+RAM_SIZE = 2048
+
+# Relations between the values of an address in consecutive snapshots, as
+# the difference (mod 256) of the later from the earlier one. `changed` is
+# any difference but 0, and `any` anything at all.
+RELATIONS = {
+    'unchanged':    0,
+    'increased':    1,
+    'decreased':    255,
+    'changed':      -1,
+    'any':          -2,
+}
+
+
+def read_snapshots(paths, offset=None):
+    """
+    Reads RAM snapshots from the files at PATHS. A file of RAM dumps holds
+    one or more consecutive 2k snapshots. For other files, eg. save states,
+    the RAM is the 2k at OFFSET.
+
+    Returns: numpy.ndarray
+    A (snapshots, 2048) array of uint8
+    """
+    snapshots = []
+    for path in paths:
+        with open(path, 'rb') as file:
+            data = file.read()
+        if offset is not None:
+            data = data[offset:offset + RAM_SIZE]
+        if not data or len(data) % RAM_SIZE:
+            raise ValueError(f'{path}: Not a 2k RAM snapshot')
+        snapshots.append(np.frombuffer(data, dtype=np.uint8)
+            .reshape(-1, RAM_SIZE))
+    return np.concatenate(snapshots)
+
+
+def narrow(snapshots, relations='changed', equal=None, candidates=None):
+    """
+    Finds the RAM addresses whose values over SNAPSHOTS fit RELATIONS.
+
+    Parameters:
+    snapshots: array-like
+        (snapshots, 2048) array of RAM snapshots, in the order taken
+    relations: str or Sequence[str]
+        The relation (see ::RELATIONS) of each snapshot to the one before,
+        or one relation for all of them
+    equal: Sequence[int] = None
+        The known value in each snapshot, None if not known, eg. the number
+        of lives left
+    candidates: array-like = None
+        Addresses to narrow down further, from an earlier search. Default is
+        all of RAM.
+
+    Returns: numpy.ndarray
+    The addresses fitting all the conditions, sorted
+    """
+    snapshots = np.asarray(snapshots, dtype=np.uint8).reshape(-1, RAM_SIZE)
+    if isinstance(relations, str):
+        relations = [relations] * (len(snapshots) - 1)
+    if len(relations) != len(snapshots) - 1:
+        raise ValueError('Need a relation for each snapshot after the first')
+    try:
+        expected = np.array([RELATIONS[R] for R in relations], dtype=np.int16)
+    except KeyError as e:
+        raise ValueError(f'Unsupported relation: {e.args[0]}') from None
+
+    if candidates is None:
+        mask = np.ones(RAM_SIZE, dtype=bool)
+    else:
+        mask = np.zeros(RAM_SIZE, dtype=bool)
+        mask[np.asarray(candidates, dtype=np.int64) % RAM_SIZE] = True
+
+    diff = snapshots[1:] - snapshots[:-1]
+    exact = expected >= 0
+    if exact.any():
+        mask &= (diff[exact] == expected[exact, None]).all(axis=0)
+    changed = expected == RELATIONS['changed']
+    if changed.any():
+        mask &= diff[changed].all(axis=0)
+
+    if equal is not None:
+        known = [i for i, V in enumerate(equal) if V is not None]
+        if known:
+            values = np.array([equal[i] for i in known], dtype=np.uint8)
+            mask &= (snapshots[known] == values[:, None]).all(axis=0)
+
+    return np.flatnonzero(mask)
+
+
+class Cheat(NamedTuple):
+    code:       str
+    addr:       int     # RAM address
+    kind:       str     # 'decrement' (undone) or 'store' (of another value)
+    location:   int     # PRG ROM offset of the patched byte
+
+
+# Decrements of memory, and the loads reading the same memory instead
+_dec_to_load = {0xC6: 0xA5, 0xD6: 0xB5, 0xCE: 0xAD, 0xDE: 0xBD}
+# Immediate loads of the register of each store
+_store_load = {'STA': 0xA9, 'STX': 0xA2, 'STY': 0xA0}
+DEX, DEY, NOP, SEC, SBC = 0xCA, 0x88, 0xEA, 0x38, 0xE9
+
+
+def find_cheats(rom_path, addresses, write=200):
+    """
+    Makes codes from the instructions of the ROM which decrement, or store
+    an immediate value to, any of the RAM ADDRESSES (see ::narrow). The
+    decrements are undone (eg. `DEC` becomes `LDA`) and the stored values
+    are replaced with WRITE. All codes have a compare value.
+
+    Returns: List[Cheat]
+    """
+    rom = open_rom(rom_path)
+    prg = rom.prg
+    xref = _open_xref(rom_path)
+    wanted = {int(A) % RAM_SIZE for A in addresses}
+
+    cheats, seen = [], set()
+    # RAM is mirrored up to $1FFF
+    for addr in sorted(A for A in xref.refs if A < 0x2000):
+        if addr % RAM_SIZE not in wanted:
+            continue
+        for ref in xref[addr]:
+            if ref.indexed:
+                continue
+            if ref.access & DECREMENT:
+                kind, patch = 'decrement', _undo_decrement(prg, ref.location)
+            elif ref.access == WRITE:
+                kind, patch = 'store', _store_immediate(prg, ref.location,
+                    write)
+            else:
+                continue
+            if patch is None:
+                continue
+            location, value = patch
+            for cpu_addr in rom.banks.cpu_addresses(location):
+                code = addr_data_to_code(cpu_addr, value, prg[location])
+                if code not in seen:
+                    seen.add(code)
+                    cheats.append(Cheat(code, addr % RAM_SIZE, kind,
+                        location))
+    return cheats
+
+def _undo_decrement(prg, location):
+    # The (location, value) patch undoing the decrement of the instruction
+    # at LOCATION, or of the register idiom (see ::xref) starting there
+    opcode = prg[location]
+    if opcode in _dec_to_load:
+        return location, _dec_to_load[opcode]
+
+    at = location + _op_length[opcode]
+    if at < len(prg) and prg[at] in (DEX, DEY):
+        return at, NOP
+    if at + 2 < len(prg) and prg[at] == SEC and prg[at + 1] == SBC:
+        # Subtract nothing
+        return at + 2, 0
+
+def _store_immediate(prg, location, write):
+    # The (location, value) patch storing WRITE rather than the immediate
+    # loaded just before the store at LOCATION
+    load = _store_load.get(_mnemonics[_op_mnemonic[prg[location]]])
+    if load is not None and location >= 2 and prg[location - 2] == load:
+        return location - 1, write
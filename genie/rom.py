@@ -0,0 +1,227 @@
+import hashlib
+import mmap
+import os
+import struct
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+
+from .mapper import BankMap
+from .metrics import active
+
+
+class Header(NamedTuple):
+    nes2:       bool    # NES 2.0 rather than (archaic) iNES
+    mapper:     int
+    submapper:  int     # 0 unless NES 2.0
+    prg_size:   int     # bytes of PRG ROM
+    chr_size:   int     # bytes of CHR ROM (0 for CHR RAM)
+    trainer:    bool
+    battery:    bool
+    mirroring:  str     # 'horizontal', 'vertical' or 'four-screen'
+    console:    int     # 0 NES/Famicom, 1 Vs. System, 2 PlayChoice-10, 3+
+
+
+def parse_header(header):
+    """
+    Reads the 16-byte iNES or NES 2.0 HEADER. Headers of the old iNES
+    format with junk in the unused bytes (eg. "DiskDude!") only have the
+    low four bits of the mapper number.
+
+    Returns: Header
+    """
+    prg, chr, flags6, flags7, byte8, byte9 = struct.unpack_from('6B',
+        header, 4)
+    nes2 = flags7 & 0x0C == 0x08
+    mapper = flags6 >> 4
+    submapper = 0
+    if nes2:
+        mapper |= (flags7 & 0xF0) | (byte8 & 0x0F) << 8
+        submapper = byte8 >> 4
+        prg_size = _nes2_size(prg, byte9 & 0x0F, 16384)
+        chr_size = _nes2_size(chr, byte9 >> 4, 8192)
+    else:
+        if flags7 & 0x0C == 0 and not any(header[12:16]):
+            mapper |= flags7 & 0xF0
+        prg_size, chr_size = 16384 * prg, 8192 * chr
+
+    if flags6 & 0x08:
+        mirroring = 'four-screen'
+    else:
+        mirroring = 'vertical' if flags6 & 0x01 else 'horizontal'
+    return Header(nes2, mapper, submapper, prg_size, chr_size,
+        bool(flags6 & 0x04), bool(flags6 & 0x02), mirroring, flags7 & 0x03)
+
+def _nes2_size(low, high, unit):
+    # Size of a ROM area from the LOW byte and HIGH nibble of NES 2.0: a
+    # number of UNITs, or if HIGH is $F, 2^E * (2M + 1) bytes as EEEEEEMM
+    if high == 0x0F:
+        return (1 << (low >> 2)) * ((low & 0x03) * 2 + 1)
+    return (high << 8 | low) * unit
+
+
+class Rom:
+    """
+    An iNES or NES 2.0 ROM image. The image is usually backed by a
+    read-only memory map of the file (see ::open_rom), and the header,
+    trainer and banks are exposed as zero-copy memoryviews of it. The
+    parsed header is `info` (see ::parse_header).
+
+    Parameters:
+    buffer: bytes-like
+        The complete contents of the ROM file, including the header
+    path: str = None
+        Where the file came from, for reference
+    """
+    PRG_BANK_SIZE = 16384
+    CHR_BANK_SIZE = 8192
+
+    def __init__(self, buffer, path=None):
+        self.path = path
+        self.buffer = buffer
+        self.data = memoryview(buffer)
+        if len(self.data) < 16 or self.data[:4] != b'NES\x1a':
+            raise ValueError(f'{path or "ROM"}: Not an iNES ROM image')
+
+        self.header = self.data[:16]
+        self.info = parse_header(self.header)
+        self.mapper = self.info.mapper
+        self.has_trainer = self.info.trainer
+        self.trainer = self.data[16:528] if self.has_trainer else None
+
+        self.offset = 16 + (512 if self.has_trainer else 0)
+        self.prg_size = self.info.prg_size
+        self.chr_offset = self.offset + self.prg_size
+        self.chr_size = self.info.chr_size
+        # In whole banks, the last of which may be short
+        self.prg_banks = -(-self.prg_size // self.PRG_BANK_SIZE)
+        self.chr_banks = -(-self.chr_size // self.CHR_BANK_SIZE)
+        self.prg = self.data[self.offset:self.chr_offset]
+        self.chr = self.data[self.chr_offset:self.chr_offset + self.chr_size]
+
+        # Results derived from the contents, see ::memo
+        self.derived = {}
+        self._digest = None
+
+    @classmethod
+    def open(cls, path):
+        with open(path, 'rb') as file:
+            stat = os.fstat(file.fileno())
+            if stat.st_size == 0:
+                raise ValueError(f'{path}: Not an iNES ROM image')
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        rom = cls(buffer, path)
+        rom.stat = (stat.st_mtime_ns, stat.st_size)
+        return rom
+
+    def prg_bank(self, index):
+        """
+        Returns: memoryview
+        The 16k PRG bank at INDEX
+        """
+        start = self.PRG_BANK_SIZE * index
+        return self.prg[start:start + self.PRG_BANK_SIZE]
+
+    def chr_bank(self, index):
+        """
+        Returns: memoryview
+        The 8k CHR bank at INDEX
+        """
+        start = self.CHR_BANK_SIZE * index
+        return self.chr[start:start + self.CHR_BANK_SIZE]
+
+    @property
+    def banks(self):
+        """
+        The ::BankMap of the PRG ROM
+        """
+        return self.memo('banks', lambda: BankMap(self.mapper, self.prg_size,
+            len(self.prg)))
+
+    def find(self, sub, start=0, end=None):
+        """
+        Like `bytes.find` over the whole image, without copying it.
+        """
+        if end is None:
+            end = len(self.data)
+        return self.buffer.find(sub, start, end)
+
+    @property
+    def digest(self):
+        """
+        SHA-1 of the whole image, as hex
+        """
+        if self._digest is None:
+            self._digest = hashlib.sha1(self.data).hexdigest()
+        return self._digest
+
+    def memo(self, key, build):
+        """
+        Returns the result derived from this ROM under KEY, calling BUILD()
+        to create it the first time.
+        """
+        metrics = active()
+        if metrics is not None:
+            metrics.hit(f'memo.{key}', key in self.derived)
+        try:
+            return self.derived[key]
+        except KeyError:
+            if metrics is not None:
+                with metrics.stage(key):
+                    result = self.derived[key] = build()
+            else:
+                result = self.derived[key] = build()
+            return result
+
+    def header_dict(self):
+        return {
+            'prg_banks':     self.prg_banks,
+            'chr_banks':     self.chr_banks,
+            'offset':        self.offset,
+            'format':        'NES 2.0' if self.info.nes2 else 'iNES',
+            'mapper':        self.mapper,
+            'submapper':     self.info.submapper,
+            'prg_size':      self.prg_size,
+            'chr_size':      self.chr_size,
+            'battery':       self.info.battery,
+            'mirroring':     self.info.mirroring,
+        }
+
+
+_open_roms = OrderedDict()
+_open_roms_max = 32
+_open_roms_lock = threading.Lock()
+
+def open_rom(rom_path):
+    """
+    Fetches the ::Rom for ROM_PATH, shared between all the functions of the
+    library. An open ROM is reused until the file's modification time or
+    size changes. ROM_PATH may also be a ::Rom already, which is returned
+    as is, so that images which are not files can be used too.
+    """
+    if isinstance(rom_path, Rom):
+        return rom_path
+
+    stat = os.stat(rom_path)
+    key = os.path.abspath(rom_path)
+    metrics = active()
+    with _open_roms_lock:
+        rom = _open_roms.get(key)
+        if rom is not None and rom.stat == (stat.st_mtime_ns, stat.st_size):
+            _open_roms.move_to_end(key)
+            if metrics is not None:
+                metrics.hit('rom_cache', True)
+            return rom
+
+        if metrics is None:
+            rom = Rom.open(rom_path)
+        else:
+            metrics.hit('rom_cache', False)
+            with metrics.stage('open_rom'):
+                rom = Rom.open(rom_path)
+        _open_roms[key] = rom
+        _open_roms.move_to_end(key)
+        while len(_open_roms) > _open_roms_max:
+            # The map is closed once nothing refers to it any longer
+            _open_roms.popitem(last=False)
+        return rom
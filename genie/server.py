@@ -0,0 +1,167 @@
+"""
+A long-running server which answers requests over a Unix socket or local
+TCP port, so that tools making many queries needn't pay for starting up
+and reading the ROM every time. Opened ROMs, and the indexes and other
+results derived from them, stay in memory (see ::open_rom).
+
+The protocol is one JSON object per line each way. A request names an
+`op` and its arguments, and may carry an `id`, which is echoed in the
+response. Requests on a connection are handled concurrently, so responses
+may come back out of order.
+
+    {"id": 1, "op": "info", "code": "GGIVNX"}
+    {"id": 1, "result": {"addr": 59999, "value": 76, "check": null}}
+
+    {"id": 2, "op": "search", "rom": "game.nes", "value": 3}
+    {"id": 2, "result": {"codes": ["PEUKYGSA", ...]}}
+
+    {"id": 3, "op": "nonesuch"}
+    {"id": 3, "error": "Unsupported op: nonesuch"}
+"""
+import asyncio
+import json
+import socket
+
+from . import addr_data_to_code, code_to_data_addr, guess_safer_code, \
+    iter_guesses_based_on_char
+from . import rom as _rom
+
+
+def op_info(code):
+    addr, value, check = code_to_data_addr(code)
+    return {'addr': addr, 'value': value, 'check': check}
+
+def op_change(code, value):
+    addr, _, check = code_to_data_addr(code)
+    return {'code': addr_data_to_code(addr, value,
+        check if check is not None else False)}
+
+def op_improve(code, rom):
+    return {'codes': sorted(guess_safer_code(code, rom))}
+
+def op_search(value, rom, write=200, harder=False, short=False,
+        check_dec=False, code_only=False, limit=None, ranked=False):
+    return {'codes': list(iter_guesses_based_on_char(bytes((value,)), rom,
+        write=write, harder=harder, short=short, check_dec=check_dec,
+        use_index=True, code_only=code_only, limit=limit, ranked=ranked))}
+
+def op_header(rom):
+    return _rom.open_rom(rom).header_dict()
+
+# Requests answered straight away, and ones which may take a while (the
+# first time for a ROM) and are run in a thread so as not to hold up the
+# others.
+_quick_ops = {
+    'info':     op_info,
+    'change':   op_change,
+}
+_slow_ops = {
+    'improve':  op_improve,
+    'search':   op_search,
+    'header':   op_header,
+}
+
+
+async def handle(request):
+    """
+    Answers one REQUEST, a dict as decoded from the JSON protocol.
+
+    Returns: dict
+    The response, with the `result` or an `error`
+    """
+    response = {'id': request.get('id')} if 'id' in request else {}
+    args = {K: V for K, V in request.items() if K not in ('id', 'op')}
+    op = request.get('op')
+    try:
+        if op in _quick_ops:
+            response['result'] = _quick_ops[op](**args)
+        elif op in _slow_ops:
+            loop = asyncio.get_running_loop()
+            response['result'] = await loop.run_in_executor(None,
+                lambda: _slow_ops[op](**args))
+        else:
+            raise ValueError(f'Unsupported op: {op}')
+    except Exception as e:
+        response['error'] = str(e) or type(e).__name__
+    return response
+
+
+async def _serve_client(reader, writer):
+    lock = asyncio.Lock()
+
+    async def answer(line):
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError('Request must be an object')
+        except ValueError as e:
+            response = {'error': f'Bad request: {e}'}
+        else:
+            response = await handle(request)
+        try:
+            line = json.dumps(response).encode()
+        except (TypeError, ValueError) as e:
+            line = json.dumps({'id': response.get('id'), 'error': str(e)}) \
+                .encode()
+        async with lock:
+            writer.write(line + b'\n')
+            await writer.drain()
+
+    pending = set()
+    try:
+        while line := await reader.readline():
+            if line.strip():
+                task = asyncio.create_task(answer(line))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+        if pending:
+            await asyncio.wait(pending)
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(path=None, host='127.0.0.1', port=None, max_roms=None):
+    """
+    Serves requests on the Unix socket at PATH, or on the TCP PORT of HOST,
+    until cancelled. MAX_ROMS bounds the number of ROMs kept open.
+    """
+    if max_roms is not None:
+        _rom._open_roms_max = max_roms
+    if path is not None:
+        server = await asyncio.start_unix_server(_serve_client, path)
+    else:
+        server = await asyncio.start_server(_serve_client, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+class Client:
+    """
+    Blocking client of the server, for scripts. Calling it sends a request
+    and waits for its response.
+
+    >>> client = Client('/tmp/genie.sock')
+    >>> client('info', code='GGIVNX')
+    {'addr': 59999, 'value': 76, 'check': None}
+    """
+    def __init__(self, path=None, host='127.0.0.1', port=None):
+        if path is not None:
+            self.socket = socket.socket(socket.AF_UNIX)
+            self.socket.connect(path)
+        else:
+            self.socket = socket.create_connection((host, port))
+        self.file = self.socket.makefile('rwb')
+
+    def __call__(self, op, **args):
+        self.file.write(json.dumps(dict(args, op=op)).encode() + b'\n')
+        self.file.flush()
+        response = json.loads(self.file.readline())
+        if 'error' in response:
+            raise ValueError(response['error'])
+        return response['result']
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
@@ -0,0 +1,129 @@
+from collections import defaultdict
+from typing import NamedTuple
+
+from .decompile import AddressingScheme, Opcode, Opcodes, _mnemonics, \
+    _mode_number, _op_length, _op_mnemonic, _op_mode, _op_table
+
+# Kinds of access of an instruction to memory, as bit flags
+READ        = 1
+WRITE       = 2
+INCREMENT   = 4
+DECREMENT   = 8
+
+_mnemonic_access = {
+    'ADC': READ, 'AND': READ, 'BIT': READ, 'CMP': READ, 'CPX': READ,
+    'CPY': READ, 'EOR': READ, 'LDA': READ, 'LDX': READ, 'LDY': READ,
+    'ORA': READ, 'SBC': READ,
+    'STA': WRITE, 'STX': WRITE, 'STY': WRITE,
+    'ASL': READ | WRITE, 'LSR': READ | WRITE, 'ROL': READ | WRITE,
+    'ROR': READ | WRITE,
+    'INC': READ | WRITE | INCREMENT,
+    'DEC': READ | WRITE | DECREMENT,
+}
+
+# Addressing modes (see ::_op_mode) which name a memory location outright,
+# and whether they're indexed
+_direct = {
+    _mode_number(AddressingScheme.ZeroPage): False,
+    _mode_number(AddressingScheme.ZeroPage_X): True,
+    _mode_number(AddressingScheme.Absolute): False,
+    _mode_number(AddressingScheme.Absolute_X): True,
+    _mode_number(AddressingScheme.Absolute_Y): True,
+}
+
+# Loads which, followed by the instruction(s), decrement or increment the
+# loaded value in a register
+_register_idioms = {
+    'LDX': {(Opcodes.DEX,): DECREMENT, (Opcodes.INX,): INCREMENT},
+    'LDY': {(Opcodes.DEY,): DECREMENT, (Opcodes.INY,): INCREMENT},
+    'LDA': {
+        (Opcodes.SBC,): DECREMENT,
+        (Opcodes.SEC, Opcodes.SBC): DECREMENT,
+        (Opcodes.ADC,): INCREMENT,
+        (Opcodes.CLC, Opcodes.ADC): INCREMENT,
+    },
+}
+
+# The above, flattened to 256-entry tables indexed by opcode
+_access = [0] * 256
+_idioms = [None] * 256
+for opcode in range(256):
+    if _op_mode[opcode] not in _direct:
+        continue
+    mnemonic = _mnemonics[_op_mnemonic[opcode]]
+    _access[opcode] = _mnemonic_access.get(mnemonic, 0)
+    if mnemonic in _register_idioms:
+        _idioms[opcode] = [
+            (bytes(T.value.opcode for T in tail), access)
+            for tail, access in _register_idioms[mnemonic].items()
+        ]
+del opcode, mnemonic
+
+
+class Reference(NamedTuple):
+    location:   int     # buffer offset of the instruction
+    opcode:     Opcode
+    access:     int     # READ, WRITE, INCREMENT and/or DECREMENT
+    indexed:    bool    # address is the base of an indexed access
+
+
+class XRef:
+    """
+    Cross reference of the memory (RAM) addresses used by compiled 6502 code
+    to the instructions which read, write, increment or decrement them.
+    """
+    def __init__(self):
+        self.refs = defaultdict(list)
+        self.access = defaultdict(int)
+
+    @classmethod
+    def build(cls, disassembly):
+        """
+        Builds the cross reference from the ::Disassembly of some code (see
+        ::decompile.disassemble). Addresses in ROM ($8000 and above) are not
+        included.
+        """
+        self = cls()
+        pcs, opcodes, operands = \
+            disassembly.pc, disassembly.opcode, disassembly.operand
+        count = len(opcodes)
+        if count and pcs[-1] + _op_length[opcodes[-1]] > len(disassembly.data):
+            # Truncated last instruction
+            count -= 1
+
+        for i in range(count):
+            opcode = opcodes[i]
+            access = _access[opcode]
+            if not access:
+                continue
+            addr = operands[i]
+            if addr >= 0x8000:
+                continue
+            self._add(addr, pcs[i], opcode, access)
+
+            idioms = _idioms[opcode]
+            if idioms:
+                for tail, access in idioms:
+                    if opcodes[i + 1:i + 1 + len(tail)] == tail:
+                        self._add(addr, pcs[i], opcode, access)
+
+        return self
+
+    def _add(self, addr, location, opcode, access):
+        self.refs[addr].append(Reference(location, _op_table[opcode], access,
+            _direct[_op_mode[opcode]]))
+        self.access[addr] |= access
+
+    def __getitem__(self, addr):
+        """
+        Returns: List[Reference]
+        The instructions referencing ADDR
+        """
+        return self.refs.get(addr, [])
+
+    def accessed(self, addr, access):
+        """
+        Returns True if ADDR is accessed in any of the ways of ACCESS, eg.
+        `xref.accessed(0x30, DECREMENT)`
+        """
+        return bool(self.access.get(addr, 0) & access)
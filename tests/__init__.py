@@ -0,0 +1,44 @@
+"""
+Tests of the package, run with `python3 -m pytest tests`. The ROMs are built
+here rather than shipped, see ::ines.
+"""
+import os
+import random
+
+# The checkout, to run the package from in a new interpreter
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def ines(prg, chr=b'', mapper=0):
+    """
+    Returns: bytes
+    An iNES image of PRG (a multiple of 16k) and CHR ROM for MAPPER
+    """
+    return b'NES\x1a' + bytes((len(prg) // 16384, len(chr) // 8192,
+        (mapper & 0x0F) << 4, mapper & 0xF0)) + bytes(8) + prg + chr
+
+def random_prg(banks, seed=0):
+    return random.Random(seed).randbytes(16384 * banks)
+
+def counters_prg():
+    """
+    Returns: bytes
+    A 16k PRG ROM keeping counters in RAM, $42 to $45, in the ways the
+    cross reference knows, from offset 0
+    """
+    code = bytes.fromhex(''.join((
+        'A903',         # 0     LDA #3
+        '8542',         # 2     STA $42
+        'C642',         # 4     DEC $42
+        'A643',         # 6     LDX $43
+        'CA',           # 8     DEX
+        '8643',         # 9     STX $43
+        'A544',         # 11    LDA $44
+        '38E901',       # 13    SEC; SBC #1
+        '8544',         # 16    STA $44
+        '9D4200',       # 18    STA $0042,X
+        'BD4500',       # 21    LDA $0045,X
+        'AD4500',       # 24    LDA $0045
+        '60',           # 27    RTS
+    )))
+    return code + bytes(16384 - len(code))
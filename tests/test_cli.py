@@ -0,0 +1,60 @@
+import subprocess
+import sys
+
+import pytest
+
+from genie import code_to_data_addr
+
+from . import ROOT, ines
+
+
+def genie(*args, input=None):
+    return subprocess.run([sys.executable, '-m', 'genie', *args],
+        input=input, capture_output=True, cwd=ROOT)
+
+def nrom(tmp_path, value):
+    # $8000: LDA #VALUE; STA $0300; JMP $8005, from reset
+    prg = bytearray(16384)
+    prg[:8] = bytes((0xA9, value, 0x8D, 0x00, 0x03, 0x4C, 0x05, 0x80))
+    prg[-6:] = b'\x00\x80\x00\x80\x00\x80'
+    path = tmp_path / 'nrom.nes'
+    path.write_bytes(ines(bytes(prg)))
+    return str(path)
+
+
+def test_search_high_value(tmp_path):
+    result = genie('search', '0x90', '-r', nrom(tmp_path, 0x90))
+    assert result.returncode == 0, result.stderr
+    codes = result.stdout.decode().split()
+    assert (0x8001, 200, 0x90) in {code_to_data_addr(C) for C in codes}
+
+def head(*args, stdin=None):
+    # Runs genie with stdout closed after the first line, as `genie .. | head
+    # -1`. Returns the line, the exit status and stderr.
+    process = subprocess.Popen([sys.executable, '-m', 'genie', *args],
+        stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=ROOT)
+    line = process.stdout.readline()
+    process.stdout.close()
+    stderr = process.stderr.read()
+    return line, process.wait(), stderr
+
+
+def test_improve_into_closed_pipe(tmp_path):
+    pytest.importorskip('numpy')
+    codes = tmp_path / 'codes.txt'
+    codes.write_text('GGIVNX\n' * 200000)
+    with open(codes, 'rb') as stdin:
+        line, status, stderr = head('improve', '-i', '-', '-r',
+            nrom(tmp_path, 3), stdin=stdin)
+    assert line.startswith(b'GGIVNX\t')
+    assert (status, stderr) == (0, b'')
+
+def test_search_into_closed_pipe(tmp_path):
+    # Many matches: LDA #3; STA $0300 over and over
+    prg = bytearray(bytes.fromhex('A9038D0003') * 3276 + bytes(4))
+    prg[-6:] = b'\x00\x80\x00\x80\x00\x80'
+    rom = tmp_path / 'many.nes'
+    rom.write_bytes(ines(bytes(prg)))
+    line, status, stderr = head('search', '3', '-r', str(rom), '--no-index')
+    assert line.strip()
+    assert (status, stderr) == (0, b'')
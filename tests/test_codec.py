@@ -0,0 +1,70 @@
+import io
+import random
+
+import pytest
+
+from genie import addr_data_to_code, code_to_data_addr
+
+np = pytest.importorskip('numpy')
+from genie.batch import decode_codes, encode_codes, read_codes, valid_codes
+
+
+def sample(count=5000, seed=0):
+    rng = random.Random(seed)
+    return [
+        (rng.randrange(0x8000, 0x10000), rng.randrange(256),
+            rng.randrange(256) if rng.random() < 0.5 else None)
+        for _ in range(count)
+    ]
+
+
+def test_round_trip():
+    for addr, data, compare in sample():
+        code = addr_data_to_code(addr, data,
+            compare if compare is not None else False)
+        assert code_to_data_addr(code) == (addr, data, compare)
+
+def test_encode_matches_scalar():
+    codes = sample()
+    addr, data, compare = (np.array([C[i] if C[i] is not None else 0
+        for C in codes]) for i in range(3))
+    short = encode_codes(addr, data)
+    long = encode_codes(addr, data, compare)
+    for i, (A, D, C) in enumerate(codes):
+        assert short[i].decode() == addr_data_to_code(A, D)
+        assert long[i].decode() == addr_data_to_code(A, D, compare[i])
+
+def test_decode_matches_scalar():
+    codes = [addr_data_to_code(A, D, C if C is not None else False)
+        for A, D, C in sample()]
+    addr, data, compare = decode_codes(codes)
+    for i, code in enumerate(codes):
+        A, D, C = code_to_data_addr(code)
+        assert (addr[i], data[i], compare[i]) == (A, D, -1 if C is None else C)
+
+def test_decode_bytes_and_str_agree():
+    codes = [addr_data_to_code(A, D) for A, D, _ in sample(100)]
+    for left, right in zip(decode_codes(codes),
+            decode_codes([C.encode() for C in codes])):
+        assert (left == right).all()
+
+def test_valid_codes_are_those_decoded():
+    codes = ['GGIVNX', 'IGSVNXTU', 'GGIVN', 'GGIVNXT', 'GGIVNB', 'IGSVNXTÉ',
+        'GGIVNXTUA']
+    for kind in (str, bytes):
+        codes = [C if kind is str else C.encode() for C in codes]
+        valid = valid_codes(codes)
+        for code, ok in zip(codes, valid.tolist()):
+            try:
+                decode_codes([code])
+            except ValueError:
+                assert not ok, code
+            else:
+                assert ok, code
+
+def test_read_codes_numbers_the_lines():
+    text = b'GGIVNX  IGSVNXTU\n\nGGIVNX\n  AAAAAA\tAAAAAA\nAAAAAA'
+    codes, lines = zip(*read_codes(io.BytesIO(text), chunk_size=5,
+        lines=True))
+    assert b' '.join(np.concatenate(codes).tolist()) == b' '.join(text.split())
+    assert np.concatenate(lines).tolist() == [1, 1, 3, 4, 4, 5]
@@ -0,0 +1,61 @@
+import io
+
+import pytest
+
+from genie import addr_data_to_code
+
+np = pytest.importorskip('numpy')
+from genie.codedb import CodeDB
+
+
+def codes(db):
+    return [C.decode() for C in db.codes().tolist()]
+
+@pytest.fixture
+def db():
+    return CodeDB.from_codes([
+        addr_data_to_code(0x9000, 1),
+        addr_data_to_code(0x8000, 1, 7),
+        addr_data_to_code(0x9000, 1),
+        addr_data_to_code(0xA000, 2),
+        addr_data_to_code(0xA000, 3),
+        addr_data_to_code(0xC000, 5, 9),
+        addr_data_to_code(0xC000, 5, 9),
+    ])
+
+
+def test_sorted_by_address(db):
+    assert db.addr.tolist() == sorted(db.addr.tolist())
+    assert len(db) == 7
+
+def test_range(db):
+    assert db.range(0x9000, 0xA001).addr.tolist() \
+        == [0x9000, 0x9000, 0xA000, 0xA000]
+    assert codes(db.lookup(0x8000)) == [addr_data_to_code(0x8000, 1, 7)]
+    assert len(db.range(0xD000, 0x10000)) == 0
+
+def test_duplicates(db):
+    assert codes(db.duplicates()) == [addr_data_to_code(0x9000, 1),
+        addr_data_to_code(0xC000, 5, 9)]
+    assert len(db.unique()) == 5
+
+def test_conflicts(db):
+    assert codes(db.conflicts()) == [addr_data_to_code(0xA000, 2),
+        addr_data_to_code(0xA000, 3)]
+
+def test_bytes_round_trip(db):
+    db.flags[2] = 0x80
+    copy = CodeDB.frombytes(db.tobytes())
+    for A, B in zip(db.arrays(), copy.arrays()):
+        assert A.tolist() == B.tolist() and A.dtype == B.dtype
+    with pytest.raises(ValueError):
+        CodeDB.frombytes(b'NOPE' + db.tobytes()[4:])
+
+def test_read_reports_invalid_codes():
+    stream = io.BytesIO(b'GGIVNX abc\nIGSVNXTU\nGGIVNXT\n')
+    invalid = []
+    db = CodeDB.read(stream, invalid=lambda *A: invalid.append(A))
+    assert invalid == [(b'abc', 1), (b'GGIVNXT', 3)]
+    assert sorted(codes(db)) == ['GGIVNX', 'IGSVNXTU']
+    with pytest.raises(ValueError):
+        CodeDB.read(io.BytesIO(b'GGIVNX abc'))
@@ -0,0 +1,46 @@
+from genie import addr_data_to_code
+from genie.cpu import CPU, RUNAWAY_PC, run_rom, screen_codes
+from genie.rom import Rom
+
+from . import ines
+
+
+def rom():
+    # $8000: JMP $8000, from reset
+    prg = bytearray(16384)
+    prg[:3] = b'\x4C\x00\x80'
+    prg[-6:] = b'\x00\x80\x00\x80\x00\x80'
+    return Rom(ines(bytes(prg)))
+
+
+def test_codes_on_the_reset_vector_are_run():
+    code = addr_data_to_code(0xFFFD, 0x30)
+    assert run_rom(rom(), [code], frames=2).crash == RUNAWAY_PC
+    result = screen_codes(rom(), [code], frames=2)[code]
+    assert result.reached and result.crash == RUNAWAY_PC
+
+def test_unread_codes_are_not_reached():
+    code, used = addr_data_to_code(0x9000, 0), addr_data_to_code(0x8001, 0)
+    results = screen_codes(rom(), [code, used], frames=2)
+    assert not results[code].reached and results[code].crash is None
+    assert results[used].reached
+
+def test_runs_end_once_back_in_step(monkeypatch):
+    # $8000: LDA #5; STA $0300; LDA #0; STA $0300; JMP $800A, from reset
+    prg = bytearray(16384)
+    prg[:13] = bytes.fromhex('A905 8D0003 A900 8D0003 4C0A80'.replace(' ', ''))
+    prg[-6:] = b'\x0A\x80\x00\x80\x0A\x80'
+    states = 0
+    state = CPU.state
+    def counted(cpu):
+        nonlocal states
+        states += 1
+        return state(cpu)
+    monkeypatch.setattr(CPU, 'state', counted)
+
+    code = addr_data_to_code(0x8001, 9)
+    clean = run_rom(Rom(ines(bytes(prg))), frames=10)
+    result = screen_codes(Rom(ines(bytes(prg))), [code], frames=10)[code]
+    assert result == clean
+    # Each frame of the run without codes, and the first of the code's
+    assert states == 10 + 1
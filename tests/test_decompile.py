@@ -0,0 +1,81 @@
+from genie.decompile import CODE, CODE_START, Opcodes, OpcodeSequence, \
+    disassemble, trace, trace_banks, _mnemonics, _op_length, _op_mnemonic, \
+    _op_table
+from genie.mapper import BankMap
+
+from . import random_prg
+
+
+def reference(data):
+    # Straightforward sweep over the opcode objects
+    pc, result = 0, []
+    while pc < len(data):
+        op = _op_table.get(data[pc])
+        length = len(op) if op else 1
+        # Unknown opcodes come with just their byte
+        result.append((op, bytes(data[pc:pc + length]) if op else data[pc],
+            pc))
+        pc += length
+    return result
+
+
+def test_tables_match_opcodes():
+    for op in Opcodes:
+        code = op.value.opcode
+        assert _op_length[code] == len(op.value)
+        assert _mnemonics[_op_mnemonic[code]] == op.name.split('_')[0]
+    unknown = set(range(256)) - set(_op_table)
+    assert all(_op_length[C] == 1 and _op_mnemonic[C] == 0xFF
+        for C in unknown)
+
+def test_disassemble_matches_reference():
+    data = random_prg(1)
+    # The last instruction may be cut short by the end of the data
+    swept = [(op, bytes(B) if op else B, pc)
+        for op, B, pc in disassemble(data)]
+    assert swept[:-1] == reference(data)[:-1]
+    assert swept[-1][2] == reference(data)[-1][2]
+
+def test_sequence_is_flat():
+    first = Opcodes.LDA(3) + Opcodes.STA_A(0x0300)
+    both = first + (Opcodes.LDX(1) + Opcodes.STX_Z(0x10))
+    assert len(both) == 4 and len(first) == 2
+    assert both.tobytes() == bytes.fromhex('a9038d0003a20186 10'.replace(
+        ' ', ''))
+    sequence = OpcodeSequence()
+    sequence += both
+    assert sequence.tobytes() == both.tobytes()
+
+def test_trace_follows_calls_and_skips_data():
+    # $8000: JSR $8006; JMP $8000; (data) $8006: RTS
+    code = bytes.fromhex('200680 4c0080 60'.replace(' ', ''))
+    data = bytearray(0x8000)
+    data[:len(code)] = code
+    data[0x7FFC:0x7FFE] = b'\x00\x80'
+    flags = trace(bytes(data), [0x8000])
+    assert flags[0] == flags[3] == flags[6] == CODE | CODE_START
+    assert flags[1] == CODE
+    assert not any(flags[7:0x7FF0])
+
+def unrom(banks=8):
+    # The fixed bank's reset code switches in bank 3 and calls into it:
+    # $C000: LDA #3; STA $8000; JSR $8000; $C008: JMP $C008
+    # Bank 3 at $8000: LDA #3; STA $0300; RTS
+    prg = bytearray(16384 * banks)
+    fixed = 16384 * (banks - 1)
+    code = bytes.fromhex('A903 8D0080 200080 4C08C0'.replace(' ', ''))
+    prg[fixed:fixed + len(code)] = code
+    prg[-6:] = b'\x08\xC0\x00\xC0\x08\xC0'
+    code = bytes.fromhex('A903 8D0003 60'.replace(' ', ''))
+    prg[3 * 16384:3 * 16384 + len(code)] = code
+    return bytes(prg)
+
+def test_trace_banks_follows_calls_into_switched_banks():
+    prg = unrom()
+    flags = trace_banks(prg, BankMap(2, len(prg)))
+    fixed = 7 * 16384
+    for at in (fixed, fixed + 2, fixed + 5, fixed + 8, 3 * 16384,
+            3 * 16384 + 2, 3 * 16384 + 5):
+        assert flags[at] == CODE | CODE_START
+    assert not any(flags[fixed + 11:fixed + 0x3FF0])
+    assert not any(flags[3 * 16384 + 6:4 * 16384])
@@ -0,0 +1,26 @@
+import pytest
+
+from genie import code_to_data_addr, guess_based_on_char
+from genie.rom import Rom
+
+from . import ines
+from .test_decompile import unrom
+
+
+@pytest.fixture
+def rom():
+    return Rom(ines(unrom(), mapper=2))
+
+
+def test_code_only_finds_code_in_switched_banks(rom):
+    found = guess_based_on_char(b'\x03', rom)
+    # LDA #3 at $8000 of bank 3, reached only by the JSR from the fixed bank
+    assert (0x8001, 200, 3) in {code_to_data_addr(C) for C in found}
+    assert guess_based_on_char(b'\x03', rom, code_only=True) == found
+
+def test_indexed_code_only_finds_code_in_switched_banks(rom, tmp_path,
+        monkeypatch):
+    monkeypatch.setenv('GENIE_CACHE', str(tmp_path))
+    found = guess_based_on_char(b'\x03', rom)
+    assert guess_based_on_char(b'\x03', rom, use_index=True,
+        code_only=True) == found
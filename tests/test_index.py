@@ -0,0 +1,56 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from genie.guess import _assign_patterns
+from genie.index import IdiomIndex, _evict, load_index
+from genie.patterns import Pattern, PatternSet
+
+from . import random_prg
+
+
+@pytest.fixture(scope='module')
+def prg():
+    return random_prg(4)
+
+
+def test_lookup_matches_scan(prg):
+    patterns = _assign_patterns()
+    index = IdiomIndex.build(patterns, prg)
+    matches = list(PatternSet(patterns).scan(prg))
+    for value in range(256):
+        assert index.lookup(value) == [
+            (M.id, M.location) for M in matches if prg[M.location] == value]
+
+def test_ids_survive_saving(prg):
+    patterns = {'a': Pattern(0xA9, None, offset=1), 2: Pattern(0xA2, None,
+        offset=1)}
+    index = IdiomIndex.build(patterns, prg)
+    loaded = IdiomIndex.frombytes(index.tobytes())
+    for value in range(256):
+        assert loaded.lookup(value) == index.lookup(value)
+
+def test_unsaveable_ids_are_refused(prg):
+    index = IdiomIndex.build({('a', 1): Pattern(0xA9)}, prg)
+    with pytest.raises(TypeError):
+        index.tobytes()
+
+def test_cache_is_shared_between_threads(prg, tmp_path, monkeypatch):
+    monkeypatch.setenv('GENIE_CACHE', str(tmp_path))
+    patterns = _assign_patterns()
+    with ThreadPoolExecutor(8) as pool:
+        indexes = list(pool.map(
+            lambda _: load_index('digest', patterns, prg), range(8)))
+    assert all(I.lookup(3) == indexes[0].lookup(3) for I in indexes)
+    assert [F.suffix for F in tmp_path.iterdir()] == ['.idx']
+    assert load_index('digest', patterns, prg).lookup(3) \
+        == indexes[0].lookup(3)
+
+def test_evict_keeps_the_most_recent(tmp_path):
+    for i in range(5):
+        path = tmp_path / f'{i}.idx'
+        path.write_bytes(b'')
+        os.utime(path, (i, i))
+    _evict(tmp_path, keep=2)
+    assert sorted(F.name for F in tmp_path.iterdir()) == ['3.idx', '4.idx']
@@ -0,0 +1,38 @@
+import zipfile
+
+from genie import addr_data_to_code
+from genie.library import Query, scan_library
+
+from .test_cli import nrom
+
+
+def test_scan_library(tmp_path, monkeypatch):
+    monkeypatch.setenv('GENIE_CACHE', str(tmp_path / 'cache'))
+    roms = tmp_path / 'roms'
+    (roms / 'sub').mkdir(parents=True)
+    rom = nrom(roms, 3)
+    with zipfile.ZipFile(roms / 'sub' / 'games.zip', 'w') as archive:
+        archive.write(rom, 'inside.nes')
+        archive.writestr('readme.txt', 'not a ROM')
+    (roms / 'sub' / 'broken.nes').write_bytes(b'not a ROM')
+    (roms / 'bad.zip').write_bytes(b'not a zip')
+    (roms / 'notes.txt').write_text('skipped')
+
+    code = addr_data_to_code(0x8001, 5)
+    records = list(scan_library([str(roms)],
+        [Query('search', 3), Query('improve', code)], workers=2))
+    by_rom = {}
+    for record in records:
+        by_rom.setdefault(record['rom'], []).append(record)
+
+    zipped = f"{roms / 'sub' / 'games.zip'}:inside.nes"
+    assert sorted(by_rom) == sorted([rom, zipped,
+        str(roms / 'sub' / 'broken.nes'), str(roms / 'bad.zip')])
+    for name in (rom, zipped):
+        search, improve = sorted(by_rom[name], key=lambda R: R['query'])[::-1]
+        assert 'EGEAPALE' in search['codes']
+        assert improve['codes'] == [addr_data_to_code(0x8001, 5, 3)]
+        assert search['sha1'] == improve['sha1']
+    for name in ('sub/broken.nes', 'bad.zip'):
+        [record] = by_rom[str(roms / name)]
+        assert set(record) == {'rom', 'error'} and record['error']
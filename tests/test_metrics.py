@@ -0,0 +1,69 @@
+import io
+import json
+import time
+
+from genie import metrics
+from genie.metrics import Metrics, active, collect, staged
+
+
+def test_counters_and_hit_rates():
+    m = Metrics()
+    m.count('bytes_scanned', 100)
+    m.count('bytes_scanned', 28)
+    m.count('codes')
+    for hit in (True, True, True, False):
+        m.hit('rom_cache', hit)
+    result = m.to_dict()
+    assert result['counters'] == {'bytes_scanned': 128, 'codes': 1,
+        'rom_cache.hits': 3, 'rom_cache.misses': 1}
+    assert result['hit_rates'] == {'rom_cache': 0.75}
+
+def test_stages_are_exclusive():
+    m = Metrics()
+    with m.stage('outer'):
+        time.sleep(0.02)
+        with m.stage('inner'):
+            time.sleep(0.05)
+    m.total = 1.0
+    result = m.to_dict()
+    stages = result['stages']
+    assert stages['outer']['calls'] == stages['inner']['calls'] == 1
+    assert 0.05 <= stages['inner']['seconds']
+    assert 0.02 <= stages['outer']['seconds'] < 0.05
+    # Slowest first
+    assert list(stages) == ['inner', 'outer']
+    assert result['seconds'] == 1.0
+
+def test_timed():
+    m = Metrics()
+    def slow():
+        for i in range(3):
+            time.sleep(0.01)
+            yield i
+    assert list(m.timed('scan', slow(), 'hits')) == [0, 1, 2]
+    # The work of each item and the end of the iteration
+    assert m.calls['scan'] == 4 and m.counters['hits'] == 3
+    assert m.seconds['scan'] >= 0.03
+
+def test_collect_and_staged():
+    @staged('work')
+    def work():
+        return active()
+
+    assert active() is None and work() is None
+    with collect() as outer:
+        assert work() is outer
+        with collect() as inner:
+            work()
+            work()
+        assert active() is outer is metrics.current
+    assert active() is None
+    assert outer.calls['work'] == 1 and inner.calls['work'] == 2
+    assert inner.total is not None
+
+def test_dump():
+    m = Metrics()
+    m.count('codes', 2)
+    stream = io.StringIO()
+    m.dump(stream)
+    assert json.loads(stream.getvalue())['counters'] == {'codes': 2}
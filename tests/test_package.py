@@ -0,0 +1,27 @@
+import subprocess
+import sys
+
+from . import ROOT
+
+
+def run(source):
+    # In a new interpreter, as the package binds its names once
+    result = subprocess.run([sys.executable, '-c', source],
+        capture_output=True, text=True, cwd=ROOT)
+    assert result.returncode == 0, result.stderr
+    return result.stdout.strip()
+
+
+def test_decompile_is_the_function_after_importing_the_module():
+    for first in ('from genie.decompile import Opcodes', 'import genie.cpu',
+            'import genie.patterns'):
+        assert run(f'{first}\nfrom genie import decompile\n'
+            'print(callable(decompile) and decompile.__name__)') == 'decompile'
+
+def test_decompile_is_the_function():
+    assert run('from genie import decompile, trace\n'
+        'print(decompile.__module__)') == 'genie.decompile'
+
+def test_exports():
+    assert run('import genie\n'
+        'print(all(hasattr(genie, N) for N in genie.__all__))') == 'True'
@@ -0,0 +1,41 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from genie.decompile import disassemble
+from genie.guess import _assign_patterns
+from genie.parallel import chunks, disassemble_parallel, scan_parallel
+from genie.patterns import PatternSet
+
+from . import random_prg
+
+
+@pytest.fixture(scope='module')
+def pool():
+    with ProcessPoolExecutor(max_workers=3) as executor:
+        yield executor
+
+@pytest.fixture(scope='module', params=[1, 5, 8])
+def prg(request):
+    return random_prg(request.param, seed=request.param)
+
+
+def test_chunks_cover_the_data():
+    for size in (1, 16384, 16385, 5 * 16384 + 7):
+        parts = chunks(size, 3)
+        assert parts[0][0] == 0 and parts[-1][1] == size
+        assert all(A[1] == B[0] for A, B in zip(parts, parts[1:]))
+        assert all(S % 16384 == 0 for S, _ in parts)
+
+def test_scan_matches_serial(prg, pool):
+    patterns = _assign_patterns()
+    serial = list(PatternSet(patterns).scan(prg))
+    assert serial
+    assert scan_parallel(prg, patterns, executor=pool) == serial
+
+def test_disassemble_matches_serial(prg, pool):
+    serial = disassemble(prg)
+    parallel = disassemble_parallel(prg, executor=pool)
+    assert list(parallel.pc) == list(serial.pc)
+    assert parallel.opcode == serial.opcode
+    assert list(parallel.operand) == list(serial.operand)
@@ -0,0 +1,42 @@
+from genie.decompile import Opcodes
+from genie.guess import _assign_patterns
+from genie.patterns import Match, Pattern, PatternSet
+
+from . import random_prg
+
+
+def separately(patterns, buffer, start=0, end=None):
+    # Each pattern tried at every position on its own, overlaps and all
+    end = len(buffer) if end is None else end
+    return [
+        Match(id, pos + P.offset, pos)
+        for pos in range(start, end) for id, P in patterns.items()
+        if P.compiled.match(buffer, pos, end)
+    ]
+
+
+PATTERNS = {
+    'lda': Pattern(Opcodes.LDA, offset=1),
+    'lda/sta': Pattern(Opcodes.LDA, Opcodes.STA_A, offset=1),
+    'lda 3': Pattern(Opcodes.LDA(3)),
+    'pair': Pattern(0xA9, 0xA9),
+    'any/sta': Pattern(None, (Opcodes.STA_A, Opcodes.STA_Z), offset=1),
+    'nop': Pattern([0xEA], None),
+}
+
+
+def test_overlapping_matches():
+    buffer = bytes.fromhex('A9A9A9038D0003A90385EAEA')
+    found = list(PatternSet(PATTERNS).scan(buffer))
+    assert found == separately(PATTERNS, buffer)
+    # LDA #$A9 and LDA #3 overlapping the LDA #$A9 before them
+    assert [M.start for M in found if M.id == 'lda'] == [0, 1, 2, 7]
+    assert [M.start for M in found if M.id == 'pair'] == [0, 1]
+
+def test_matches_separate_scans():
+    buffer = random_prg(1, seed=3) + bytes.fromhex('A9A9A98D') * 64
+    patterns = dict(PATTERNS, **_assign_patterns())
+    assert list(PatternSet(patterns).scan(buffer)) \
+        == separately(patterns, buffer)
+    assert list(PatternSet(patterns).scan(buffer, 100, 5000)) \
+        == separately(patterns, buffer, 100, 5000)
@@ -0,0 +1,42 @@
+import random
+
+from genie import addr_data_to_code, code_to_data_addr
+from genie.port import port_codes
+from genie.rom import Rom
+
+from . import ines, random_prg
+
+
+def revisions():
+    # A 32k ROM and a revision of it with 0x64 bytes put in at $9000 (so
+    # what follows moves up), and $D000-$D0FF rewritten
+    rng = random.Random(1)
+    source = random_prg(2)
+    target = bytearray(source[:0x1000] + rng.randbytes(0x64)
+        + source[0x1000:-0x64])
+    target[0x5000:0x5100] = rng.randbytes(0x100)
+    return Rom(ines(source)), Rom(ines(bytes(target)))
+
+
+def test_port_moved_codes():
+    source, target = revisions()
+    codes = [addr_data_to_code(0xA000, 9),
+        addr_data_to_code(0x8800, 9, source.prg[0x800])]
+    ports = port_codes(codes, source, target)
+
+    port = ports[codes[0]]
+    assert port.location == 0x2064 and port.score > 4
+    assert code_to_data_addr(port.code) == (0xA064, 9, target.prg[0x2064])
+    # Before the change, nothing moved
+    port = ports[codes[1]]
+    assert code_to_data_addr(port.code) == (0x8800, 9, source.prg[0x800])
+
+def test_port_not_found():
+    source, target = revisions()
+    codes = [
+        # Rewritten
+        addr_data_to_code(0xD080, 9),
+        # The compare value isn't that of the source
+        addr_data_to_code(0xA000, 9, source.prg[0x2000] ^ 0xFF),
+    ]
+    assert port_codes(codes, source, target) == dict.fromkeys(codes)
@@ -0,0 +1,66 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+from genie import addr_data_to_code
+from genie.ramsearch import RAM_SIZE, find_cheats, narrow, read_snapshots
+from genie.rom import Rom
+
+from . import counters_prg, ines
+
+
+def snapshots(values):
+    # RAM snapshots of VALUES, a dict of {address: values over the
+    # snapshots}, and of 7 anywhere else
+    ram = np.full((len(next(iter(values.values()))), RAM_SIZE), 7,
+        dtype=np.uint8)
+    for addr, series in values.items():
+        ram[:, addr] = series
+    return ram
+
+
+def test_narrow_across_snapshots():
+    ram = snapshots({0x30: [3, 2, 1], 0x31: [5, 4, 3], 0x32: [3, 2, 2],
+        0x33: [1, 2, 3]})
+    assert narrow(ram, 'decreased').tolist() == [0x30, 0x31]
+    assert narrow(ram, 'decreased', [3, 2, 1]).tolist() == [0x30]
+    assert narrow(ram, 'any', [None, None, 1]).tolist() == [0x30]
+    assert narrow(ram, ['decreased', 'unchanged']).tolist() == [0x32]
+    assert narrow(ram, 'increased', candidates=[0x30, 0x33]).tolist() \
+        == [0x33]
+    # Each search narrows down the last
+    first = narrow(ram[:2], 'changed')
+    assert narrow(ram[1:], 'decreased', candidates=first).tolist() \
+        == [0x30, 0x31]
+
+def test_narrow_rejects_bad_relations():
+    ram = snapshots({0x30: [3, 2, 1]})
+    with pytest.raises(ValueError):
+        narrow(ram, ['decreased'])
+    with pytest.raises(ValueError):
+        narrow(ram, 'halved')
+
+def test_read_snapshots(tmp_path):
+    ram = snapshots({0x30: [3, 2, 1]})
+    (tmp_path / 'dumps.bin').write_bytes(ram[:2].tobytes())
+    (tmp_path / 'state.sav').write_bytes(b'head' + ram[2].tobytes() + b'foot')
+    assert (read_snapshots([tmp_path / 'dumps.bin']) == ram[:2]).all()
+    assert (read_snapshots([tmp_path / 'state.sav'], 4) == ram[2]).all()
+    (tmp_path / 'short.bin').write_bytes(bytes(100))
+    with pytest.raises(ValueError):
+        read_snapshots([tmp_path / 'short.bin'])
+
+
+def test_find_cheats():
+    prg = counters_prg()
+    cheats = find_cheats(Rom(ines(prg)), [0x42, 0x43, 0x844], write=9)
+    assert [(C.addr, C.kind, C.location) for C in cheats[::2]] == [
+        (0x42, 'store', 1), (0x42, 'decrement', 4), (0x43, 'decrement', 8),
+        (0x44, 'decrement', 15),
+    ]
+    # At both mirrors of the 16k ROM, with the value replaced (the
+    # immediate, DEC by LDA, DEX by NOP and SBC #1 by SBC #0)
+    assert [C.code for C in cheats] == [
+        addr_data_to_code(B + L, V, prg[L])
+        for L, V in ((1, 9), (4, 0xA5), (8, 0xEA), (15, 0))
+        for B in (0x8000, 0xC000)
+    ]
@@ -0,0 +1,75 @@
+import pytest
+
+from genie import addr_data_to_code, guess_safer_code
+from genie.mapper import BankMap
+from genie.rom import Rom, parse_header
+
+from . import ines, random_prg
+
+
+def header(prg, chr, flags6, flags7, byte8=0, byte9=0, rest=bytes(6)):
+    return b'NES\x1a' + bytes((prg, chr, flags6, flags7, byte8, byte9)) + rest
+
+
+def test_ines_header():
+    info = parse_header(header(16, 8, 0x13, 0x10))
+    assert (info.nes2, info.mapper, info.prg_size, info.chr_size) \
+        == (False, 17, 16 * 16384, 8 * 8192)
+    assert info.battery and info.mirroring == 'vertical'
+
+def test_ines_header_with_junk_has_low_mapper_only():
+    assert parse_header(header(16, 8, 0x13, 0x10, rest=b'Dude!\0')).mapper == 1
+
+def test_nes2_header():
+    info = parse_header(header(0x02, 0x01, 0x41, 0x48, 0x21, 0x01))
+    assert info.nes2
+    assert (info.mapper, info.submapper) == (0x144, 2)
+    assert info.prg_size == 0x102 * 16384 and info.chr_size == 8192
+
+def test_nes2_exponent_size():
+    # 2^3 * (2 * 1 + 1)
+    assert parse_header(header(0x0D, 0, 0, 0x08, 0, 0x0F)).prg_size == 24
+
+def test_rom_reads_nes2_sizes():
+    rom = Rom(b'NES\x1a' + bytes((2, 0, 0x20, 0x08, 0, 0)) + bytes(6)
+        + random_prg(2))
+    assert rom.mapper == 2 and rom.prg_size == 32768 and rom.prg_banks == 2
+
+
+def test_nrom_128_is_mirrored():
+    banks = BankMap(0, 16384)
+    assert banks.offsets(0x8123) == banks.offsets(0xC123) == [0x123]
+    assert banks.cpu_addresses(0x123) == [0x8123, 0xC123]
+
+def test_unrom_fixes_the_last_bank():
+    banks = BankMap(2, 8 * 16384)
+    assert banks.offsets(0xC010) == [7 * 16384 + 0x10]
+    assert banks.offsets(0x8010) == [B * 16384 + 0x10 for B in range(8)]
+    assert banks.cpu_addresses(3 * 16384 + 0x10) == [0x8010]
+    assert banks.cpu_addresses(7 * 16384 + 0x10) == [0x8010, 0xC010]
+
+def test_mmc3_switches_8k():
+    banks = BankMap(4, 4 * 16384)
+    assert len(banks.offsets(0xA000)) == 8
+    assert banks.offsets(0xE001) == [7 * 8192 + 1]
+
+def test_unknown_and_oversized_fixed_default_to_unrom():
+    for mapper in (0, 250):
+        assert BankMap(mapper, 4 * 16384).pages == BankMap(2, 4 * 16384).pages
+
+def test_truncated_rom():
+    banks = BankMap(2, 4 * 16384, available=16384 + 10)
+    assert banks.offsets(0x8005) == [5, 16384 + 5]
+    assert banks.offsets(0x8010) == [0x10]
+    assert banks.offsets(0xC000) == []
+
+def test_improve_uses_the_mapped_banks_only():
+    prg = bytearray(4 * 16384)
+    for bank in range(4):
+        prg[bank * 16384 + 0x100] = 0x10 + bank
+    rom = Rom(ines(bytes(prg), bytes(8192), mapper=2))
+    code = addr_data_to_code(0x8100, 0)
+    assert guess_safer_code(code, rom) == {
+        addr_data_to_code(0x8100, 0, 0x10 + B) for B in range(4)}
+    code = addr_data_to_code(0xC100, 0)
+    assert guess_safer_code(code, rom) == {addr_data_to_code(0xC100, 0, 0x13)}
@@ -0,0 +1,45 @@
+import asyncio
+import json
+
+from genie.server import serve
+
+from .test_cli import nrom
+
+
+async def exchange(path, lines):
+    # Sends LINES to the server at PATH, and returns the responses by id
+    for _ in range(100):
+        try:
+            reader, writer = await asyncio.open_unix_connection(path)
+            break
+        except (FileNotFoundError, ConnectionRefusedError):
+            await asyncio.sleep(0.01)
+    writer.write(b''.join(L + b'\n' for L in lines))
+    await writer.drain()
+    responses = [json.loads(await reader.readline()) for _ in lines]
+    writer.close()
+    return {R.get('id'): R for R in responses}
+
+async def session(path, lines):
+    server = asyncio.create_task(serve(path))
+    try:
+        return await exchange(path, lines)
+    finally:
+        server.cancel()
+
+
+def test_requests(tmp_path, monkeypatch):
+    monkeypatch.setenv('GENIE_CACHE', str(tmp_path))
+    rom = nrom(tmp_path, 3)
+    responses = asyncio.run(session(str(tmp_path / 'genie.sock'), [
+        b'{"id": 1, "op": "info", "code": "GGIVNX"}',
+        b'{"id": 2, "op": "info", ',
+        b'{"id": 3, "op": "nonesuch"}',
+        json.dumps({'id': 4, 'op': 'search', 'rom': rom, 'value': 3})
+            .encode(),
+    ]))
+    assert responses[1] == {'id': 1,
+        'result': {'addr': 0xEA5F, 'value': 76, 'check': None}}
+    assert responses[None]['error'].startswith('Bad request')
+    assert responses[3] == {'id': 3, 'error': 'Unsupported op: nonesuch'}
+    assert 'EGEAPALE' in responses[4]['result']['codes']
@@ -0,0 +1,32 @@
+from genie.decompile import disassemble
+from genie.xref import DECREMENT, INCREMENT, READ, WRITE, XRef
+
+from . import counters_prg
+
+
+def sites(xref, addr):
+    return sorted((R.location, R.access, R.indexed) for R in xref[addr])
+
+
+def test_reads_and_writes():
+    xref = XRef.build(disassemble(counters_prg()))
+    assert sites(xref, 0x42) == [
+        (2, WRITE, False),
+        (4, READ | WRITE | DECREMENT, False),
+        (18, WRITE, True),
+    ]
+    # The register idioms: LDX; DEX and LDA; SEC; SBC
+    assert sites(xref, 0x43) == [(6, READ, False), (6, DECREMENT, False),
+        (9, WRITE, False)]
+    assert sites(xref, 0x44) == [(11, READ, False), (11, DECREMENT, False),
+        (16, WRITE, False)]
+    assert sites(xref, 0x45) == [(21, READ, True), (24, READ, False)]
+    # Immediates, the ROM and untouched RAM aren't memory referenced
+    assert set(xref.refs) == {0x42, 0x43, 0x44, 0x45}
+    assert xref[0x46] == []
+
+def test_accessed():
+    xref = XRef.build(disassemble(counters_prg()))
+    assert xref.accessed(0x43, DECREMENT)
+    assert not xref.accessed(0x43, INCREMENT)
+    assert xref.accessed(0x45, READ) and not xref.accessed(0x45, WRITE)